@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Assessment runner for exported Bonsai brains.
+
+An exported brain runs as a local container that answers a POST on `/v1/prediction`
+with the action for the state in the body. This runner steps many BeerGame episodes
+concurrently and queries the brain through one pooled keep-alive session.
+
+Usage:
+  Against a running brain container:
+    python assess.py --url http://localhost:5000 --configs configs.json --episodes 50
+  Against the local stand-in prediction server (for testing the runner itself):
+    python assess.py --stand-in --episodes 50
+  A local policy (.npz MLP weights or .onnx), all episodes batched through one forward pass per step:
+    python assess.py --policy policy.npz --configs configs.json --episodes 500
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections.abc import Mapping
+from typing import Any
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+from sim.beer_game import BeerGame
+from sim.const import AGENT_TYPE_BONSAI
+from sim.evaluation import episode_config
+from sim.policy import BatchedPolicyRunner, load_policy
+
+_LOGGER = logging.getLogger(__name__)
+
+PREDICTION_PATH = "/v1/prediction"
+# responses worth retrying, other errors (bad request, not found, ...) fail right away
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class BrainClient:
+    """Client for an exported brain, using one pooled session with bounded concurrency."""
+
+    def __init__(
+        self,
+        url: str,
+        concurrency: int = 32,
+        timeout: float = 10,
+        retries: int = 3,
+        backoff: float = 0.5,
+    ) -> None:
+        """Create the client, the session is opened lazily.
+
+        Timeouts, connection errors and transient responses are retried up to retries times,
+        waiting backoff seconds, doubled after every attempt.
+        """
+        self.url = url.rstrip("/") + PREDICTION_PATH
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.predictions = 0
+        self.retried = 0
+        self._session: aiohttp.ClientSession | None = None
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def __aenter__(self) -> BrainClient:
+        """Open the pooled session."""
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency, keepalive_timeout=60, force_close=False
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        """Close the pooled session."""
+        await self.close()
+
+    async def close(self) -> None:
+        """Close the session."""
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    async def predict(self, state: Mapping[str, Any]) -> int:
+        """Get the order for a state from the brain."""
+        assert self._session, "Use the client as an async context manager."
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    async with self._session.post(self.url, json=state) as response:
+                        response.raise_for_status()
+                        action = await response.json()
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                if attempt == self.retries or (
+                    isinstance(exc, aiohttp.ClientResponseError)
+                    and exc.status not in RETRY_STATUSES
+                ):
+                    raise
+                self.retried += 1
+                _LOGGER.debug("Retrying prediction after %r", exc)
+                await asyncio.sleep(self.backoff * 2**attempt)
+        self.predictions += 1
+        return int(action["order"])
+
+
+async def run_episode(
+    client: BrainClient, config: Mapping[str, Any], iterations: int
+) -> tuple[float, list[dict[str, float]]]:
+    """Run a single episode with the brain deciding the orders of the first agent, returns the cumulative costs and KPIs."""
+    beergame = BeerGame()
+    beergame.reset(**episode_config(config, AGENT_TYPE_BONSAI))
+    for _ in range(iterations):
+        order = await client.predict(beergame.state)
+        beergame.step(order)
+    return beergame.state["cumulative_costs"], beergame.kpis.report
+
+
+def summarize(costs: list[float]) -> dict[str, float | None]:
+    """Summarize the cost distribution of a set of episodes, the statistics are None without episodes."""
+    if not costs:
+        return {
+            "episodes": 0,
+            **{key: None for key in ("mean", "std", "min", "p5", "p50", "p95", "max")},
+        }
+    values = np.asarray(costs, dtype=float)
+    p5, p50, p95 = np.percentile(values, [5, 50, 95])
+    return {
+        "episodes": len(values),
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+        "min": float(values.min()),
+        "p5": float(p5),
+        "p50": float(p50),
+        "p95": float(p95),
+        "max": float(values.max()),
+    }
+
+
+def summarize_kpis(kpis: list[list[dict[str, float]]]) -> list[dict[str, float]]:
+    """Average the KPI reports of a set of episodes, per agent."""
+    return [
+        {key: float(np.mean([agent[key] for agent in agents])) for key in agents[0]}
+        for agents in zip(*kpis)
+    ]
+
+
+async def assess(
+    url: str,
+    configs: list[dict[str, Any]],
+    episodes: int = 10,
+    iterations: int = 100,
+    concurrency: int = 32,
+    retries: int = 3,
+) -> list[dict[str, Any]]:
+    """Assess the brain at url on every config, returns a report per config.
+
+    Episodes that still fail after the retries are counted per config, with their errors,
+    instead of aborting the assessment.
+    """
+    async with BrainClient(url, concurrency=concurrency, retries=retries) as client:
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *[
+                asyncio.gather(
+                    *[run_episode(client, config, iterations) for _ in range(episodes)],
+                    return_exceptions=True,
+                )
+                for config in configs
+            ]
+        )
+        elapsed = time.perf_counter() - start
+        _LOGGER.info(
+            "%s predictions in %.2fs (%.0f/s), %s retried",
+            client.predictions,
+            elapsed,
+            client.predictions / elapsed if elapsed else 0,
+            client.retried,
+        )
+    report = []
+    for config, episodes_results in zip(configs, results):
+        finished = [
+            result for result in episodes_results if not isinstance(result, Exception)
+        ]
+        errors = [
+            f"{type(result).__name__}: {result}"
+            for result in episodes_results
+            if isinstance(result, Exception)
+        ]
+        if errors:
+            _LOGGER.warning("%s episodes failed for %s", len(errors), config)
+        report.append(
+            {
+                "config": config,
+                "costs": summarize([costs for costs, _ in finished]),
+                "kpis": summarize_kpis([kpis for _, kpis in finished]),
+                "failed": len(errors),
+                "errors": sorted(set(errors)),
+            }
+        )
+    return report
+
+
+def assess_policy(
+    path: str,
+    configs: list[dict[str, Any]],
+    episodes: int = 10,
+    iterations: int = 100,
+) -> list[dict[str, Any]]:
+    """Assess a local policy on every config, returns a report per config.
+
+    The episodes of all configs are stepped together, with one forward pass of the policy per step.
+    The policy drives the first agent, whatever agent type the config sets for it.
+    """
+    sims = []
+    for config in configs:
+        for _ in range(episodes):
+            beergame = BeerGame()
+            beergame.reset(**episode_config(config, AGENT_TYPE_BONSAI))
+            sims.append(beergame)
+    start = time.perf_counter()
+    costs = BatchedPolicyRunner(load_policy(path), sims).run(iterations)
+    _LOGGER.info(
+        "%s decisions in %.2fs", len(sims) * iterations, time.perf_counter() - start
+    )
+    return [
+        {
+            "config": config,
+            "costs": summarize(costs[num * episodes : (num + 1) * episodes]),
+            "kpis": summarize_kpis(
+                [sim.kpis.report for sim in sims[num * episodes : (num + 1) * episodes]]
+            ),
+        }
+        for num, config in enumerate(configs)
+    ]
+
+
+def stand_in_app() -> web.Application:
+    """Create a local stand-in for an exported brain.
+
+    It orders whatever the first agent still has to fill, which is enough to exercise the runner.
+    """
+
+    async def prediction(request: web.Request) -> web.Response:
+        state = await request.json()
+        return web.json_response(
+            {"order": max(0, int(state["customer_orders_to_be_filled"][0]))}
+        )
+
+    app = web.Application()
+    app.router.add_post(PREDICTION_PATH, prediction)
+    return app
+
+
+async def run_with_stand_in(port: int, **kwargs: Any) -> list[dict[str, Any]]:
+    """Start the stand-in server on localhost and assess against it."""
+    runner = web.AppRunner(stand_in_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    try:
+        return await assess(f"http://127.0.0.1:{port}", **kwargs)
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Assess an exported Bonsai brain.")
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        help="Log level used by the logging package, defaults to info.",
+        default="INFO",
+    )
+    parser.add_argument(
+        "--url",
+        type=str,
+        help="Base url of the exported brain.",
+        default="http://localhost:5000",
+    )
+    parser.add_argument(
+        "--configs",
+        type=str,
+        metavar="CONFIG FILE",
+        help="JSON file with a list of BeerGame.reset configs, defaults to one default config.",
+        default=None,
+    )
+    parser.add_argument("--episodes", type=int, help="Episodes per config.", default=10)
+    parser.add_argument(
+        "--iterations", type=int, help="Iterations per episode.", default=100
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        help="Maximum number of concurrent predictions.",
+        default=32,
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        help="Retries of a prediction after a timeout or transient error.",
+        default=3,
+    )
+    parser.add_argument(
+        "--stand-in",
+        action="store_true",
+        default=False,
+        help="Run against a local stand-in prediction server instead of --url.",
+    )
+    parser.add_argument(
+        "--port", type=int, help="Port for the stand-in server.", default=5005
+    )
+    parser.add_argument(
+        "--policy",
+        type=str,
+        metavar="POLICY FILE",
+        help="Assess a local policy (.npz MLP weights or .onnx) instead of a brain.",
+        default=None,
+    )
+
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper())
+
+    configs: list[dict[str, Any]] = [{}]
+    if args.configs:
+        with open(args.configs) as file:
+            configs = json.load(file)
+
+    kwargs = {
+        "configs": configs,
+        "episodes": args.episodes,
+        "iterations": args.iterations,
+        "concurrency": args.concurrency,
+        "retries": args.retries,
+    }
+    if args.policy:
+        report = assess_policy(
+            args.policy, configs, episodes=args.episodes, iterations=args.iterations
+        )
+    elif args.stand_in:
+        report = asyncio.run(run_with_stand_in(args.port, **kwargs))
+    else:
+        report = asyncio.run(assess(args.url, **kwargs))
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Build steady-state warm starts for a config.
+
+The config is run with its agent types as reference policies until the chain is in steady state,
+then snapshots are stored in the warm start library under a key. Episodes start from one of them
+with BeerGame.reset(warm_start=key). A config that is not in steady state after --max-burn-in steps
+is refused, nothing is stored for it.
+
+Usage:
+    python build_warm_starts.py --config config.json --key basestock --count 20
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+from typing import Any
+
+from sim.warm_start import DEFAULT_LIBRARY_PATH, WarmStartLibrary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build BeerGame warm starts.")
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        help="Log level used by the logging package, defaults to info.",
+        default="INFO",
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        metavar="CONFIG FILE",
+        help="JSON file with the BeerGame.reset config, defaults to the default config.",
+        default=None,
+    )
+    parser.add_argument(
+        "--library",
+        type=str,
+        help="The warm start library file.",
+        default=DEFAULT_LIBRARY_PATH,
+    )
+    parser.add_argument(
+        "--key",
+        type=str,
+        help="Key of the warm start, defaults to a hash of the config.",
+        default=None,
+    )
+    parser.add_argument("--count", type=int, help="Number of snapshots.", default=20)
+    parser.add_argument(
+        "--spacing", type=int, help="Steps between snapshots.", default=10
+    )
+    parser.add_argument(
+        "--block",
+        type=int,
+        help="Steps per block of the steady state check.",
+        default=50,
+    )
+    parser.add_argument(
+        "--blocks",
+        type=int,
+        help="Consecutive blocks that have to agree for the steady state check.",
+        default=4,
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        help="Spread of the block means, in block standard deviations, that counts as steady.",
+        default=1.0,
+    )
+    parser.add_argument(
+        "--max-burn-in", type=int, help="Maximum number of burn-in steps.", default=2000
+    )
+    parser.add_argument(
+        "--action", type=int, help="Order used by Bonsai agents.", default=0
+    )
+    parser.add_argument("--seed", type=int, help="Seed of the sim.", default=0)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper())
+
+    config: dict[str, Any] = {}
+    if args.config:
+        with open(args.config) as file:
+            config = json.load(file)
+
+    library = WarmStartLibrary(args.library)
+    try:
+        key = library.build(
+            config,
+            key=args.key,
+            count=args.count,
+            spacing=args.spacing,
+            block=args.block,
+            blocks=args.blocks,
+            tolerance=args.tolerance,
+            max_burn_in=args.max_burn_in,
+            seed=args.seed,
+            action=args.action,
+        )
+    except ValueError as exc:
+        parser.exit(1, f"{exc}\n")
+    library.save()
+    print(key)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Compare policies on common random numbers.
+
+Every policy sees the same demand and lead time realizations, the report contains paired
+confidence intervals of the cost differences with the first policy.
+
+Usage:
+    python compare.py strm basestock --target-half-width 200 --antithetic
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+from typing import Any
+
+from sim.evaluation import compare_policies
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare BeerGame policies.")
+    parser.add_argument(
+        "policies",
+        nargs="+",
+        help="Agent types used for the first agent, the first one is the baseline.",
+    )
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        help="Log level used by the logging package, defaults to info.",
+        default="INFO",
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        metavar="CONFIG FILE",
+        help="JSON file with the BeerGame.reset config, defaults to the default config.",
+        default=None,
+    )
+    parser.add_argument(
+        "--iterations", type=int, help="Iterations per episode.", default=100
+    )
+    parser.add_argument(
+        "--antithetic",
+        action="store_true",
+        default=False,
+        help="Use antithetic pairs of episodes.",
+    )
+    parser.add_argument(
+        "--target-half-width",
+        type=float,
+        help="Stop once every paired confidence interval is narrower than this.",
+        default=None,
+    )
+    parser.add_argument(
+        "--confidence", type=float, help="Confidence level.", default=0.95
+    )
+    parser.add_argument(
+        "--min-pairs", type=int, help="Minimum number of observations.", default=10
+    )
+    parser.add_argument(
+        "--max-pairs", type=int, help="Maximum number of observations.", default=1000
+    )
+    parser.add_argument("--seed", type=int, help="First seed.", default=0)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper())
+
+    config: dict[str, Any] = {}
+    if args.config:
+        with open(args.config) as file:
+            config = json.load(file)
+
+    report = compare_policies(
+        config,
+        args.policies,
+        iterations=args.iterations,
+        antithetic=args.antithetic,
+        target_half_width=args.target_half_width,
+        confidence=args.confidence,
+        min_pairs=args.min_pairs,
+        max_pairs=args.max_pairs,
+        seed=args.seed,
+    )
+    print(json.dumps(report, indent=2))
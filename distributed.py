@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+Distributed evaluation of BeerGame policies.
+
+A coordinator splits a sweep into work units (config, policy, seed range) and serves them over HTTP.
+Workers on any host pull units, run the episodes locally and send back the aggregated costs.
+Workers send heartbeats while running a unit, units of lost workers are re-queued and idle workers
+steal a copy of the longest running unit when the queue is empty, the first result wins.
+Workers report units that raise an error, a unit that failed or was lost max_attempts times is
+reported as failed instead of being retried forever.
+
+Usage:
+  Coordinator:
+    python distributed.py coordinator --sweep sweep.json --port 8765
+  Worker (on any host that can reach the coordinator):
+    python distributed.py worker --url http://<coordinator>:8765
+  Everything on localhost, with 4 worker processes:
+    python distributed.py local --sweep sweep.json --workers 4
+
+The sweep file contains a list of {"config": {...}, "policy": "strm", "episodes": 100, "iterations": 100}.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import socket
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any
+
+import aiohttp
+from aiohttp import web
+
+from sim.cache import EpisodeCache
+from sim.evaluation import run_episode
+from sim.kpi import RunningStats
+
+_LOGGER = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 2.0
+LEASE_TIMEOUT = 10.0
+MAX_ATTEMPTS = 3
+
+
+@dataclass
+class WorkUnit:
+    """A range of seeds for one entry of the sweep."""
+
+    unit_id: str
+    sweep_index: int
+    config: dict[str, Any]
+    policy: str | None
+    seed_start: int
+    seed_stop: int
+    iterations: int
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the unit as sent to the workers."""
+        return {
+            "unit_id": self.unit_id,
+            "config": self.config,
+            "policy": self.policy,
+            "seed_start": self.seed_start,
+            "seed_stop": self.seed_stop,
+            "iterations": self.iterations,
+        }
+
+
+@dataclass
+class Lease:
+    """A unit handed out to one or more workers."""
+
+    unit: WorkUnit
+    workers: dict[str, float] = field(default_factory=dict)  # worker id: deadline
+    started: float = field(default_factory=time.monotonic)
+
+
+def split_sweep(sweep: list[dict[str, Any]], unit_size: int) -> list[WorkUnit]:
+    """Split the sweep into work units of at most unit_size episodes."""
+    units = []
+    for index, entry in enumerate(sweep):
+        seed = entry.get("seed", 0)
+        for start in range(seed, seed + entry.get("episodes", 10), unit_size):
+            units.append(
+                WorkUnit(
+                    unit_id=f"{index}-{start}",
+                    sweep_index=index,
+                    config=entry.get("config", {}),
+                    policy=entry.get("policy"),
+                    seed_start=start,
+                    seed_stop=min(start + unit_size, seed + entry.get("episodes", 10)),
+                    iterations=entry.get("iterations", 100),
+                )
+            )
+    return units
+
+
+class Coordinator:
+    """Serve work units and collect the results."""
+
+    def __init__(
+        self,
+        sweep: list[dict[str, Any]],
+        unit_size: int = 10,
+        lease_timeout: float = LEASE_TIMEOUT,
+        max_attempts: int = MAX_ATTEMPTS,
+    ) -> None:
+        """Create the coordinator for a sweep."""
+        self.sweep = sweep
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.units = {unit.unit_id: unit for unit in split_sweep(sweep, unit_size)}
+        self.pending: deque[WorkUnit] = deque(self.units.values())
+        self.total = len(self.pending)
+        self.leases: dict[str, Lease] = {}
+        self.completed: set[str] = set()
+        self.failed: dict[str, str] = {}  # unit id: last error
+        self.attempts: dict[str, int] = {}
+        self.errors: dict[str, str] = {}
+        self.results = [RunningStats() for _ in sweep]
+        self.requeued = 0
+        self.stolen = 0
+        self.finished = asyncio.Event()
+        if not self.total:
+            self.finished.set()
+
+    @property
+    def done(self) -> bool:
+        """Return True when all units are completed or failed."""
+        return len(self.completed) + len(self.failed) == self.total
+
+    def next_unit(self, worker_id: str) -> WorkUnit | None:
+        """Return the next unit for a worker, stealing a running unit if nothing is pending."""
+        deadline = time.monotonic() + self.lease_timeout
+        if self.pending:
+            unit = self.pending.popleft()
+            self.leases[unit.unit_id] = Lease(unit, {worker_id: deadline})
+            return unit
+        candidates = [
+            lease for lease in self.leases.values() if worker_id not in lease.workers
+        ]
+        if not candidates:
+            return None
+        lease = min(candidates, key=lambda lease: lease.started)
+        lease.workers[worker_id] = deadline
+        self.stolen += 1
+        _LOGGER.debug("Worker %s steals unit %s", worker_id, lease.unit.unit_id)
+        return lease.unit
+
+    def heartbeat(self, worker_id: str) -> None:
+        """Extend the leases of a worker."""
+        deadline = time.monotonic() + self.lease_timeout
+        for lease in self.leases.values():
+            if worker_id in lease.workers:
+                lease.workers[worker_id] = deadline
+
+    def complete(self, unit_id: str, costs: dict[str, float]) -> None:
+        """Store the result of a unit, results for unknown or already completed units are ignored.
+
+        A late result, from a worker whose lease expired, still counts and takes the unit out of the queue.
+        """
+        if unit_id in self.completed or unit_id not in self.units:
+            return
+        if self.failed.pop(unit_id, None) is not None:
+            _LOGGER.info("Late result for failed unit %s", unit_id)
+        elif self.leases.pop(unit_id, None) is None:
+            _LOGGER.info("Late result for unit %s", unit_id)
+            self.pending = deque(
+                unit for unit in self.pending if unit.unit_id != unit_id
+            )
+        self.completed.add(unit_id)
+        self.results[self.units[unit_id].sweep_index].merge(
+            RunningStats.from_dict(costs)
+        )
+        _LOGGER.info("Completed %s/%s units", len(self.completed), self.total)
+        if self.done:
+            self.finished.set()
+
+    def fail(self, unit_id: str, worker_id: str, error: str) -> None:
+        """Drop a worker whose unit raised an error, the unit is retried once no other worker runs it."""
+        lease = self.leases.get(unit_id)
+        if lease is None or worker_id not in lease.workers:
+            return
+        _LOGGER.warning("Worker %s failed unit %s: %s", worker_id, unit_id, error)
+        del lease.workers[worker_id]
+        self.errors[unit_id] = error
+        if not lease.workers:
+            del self.leases[unit_id]
+            self.retry(lease.unit)
+
+    def retry(self, unit: WorkUnit) -> None:
+        """Re-queue a unit without workers, or mark it failed after max_attempts."""
+        attempts = self.attempts[unit.unit_id] = self.attempts.get(unit.unit_id, 0) + 1
+        if attempts < self.max_attempts:
+            self.pending.appendleft(unit)
+            self.requeued += 1
+            return
+        error = self.errors.get(unit.unit_id, "lease expired")
+        _LOGGER.error("Unit %s failed %s times: %s", unit.unit_id, attempts, error)
+        self.failed[unit.unit_id] = error
+        if self.done:
+            self.finished.set()
+
+    def expire_leases(self) -> None:
+        """Drop workers that missed their heartbeats and re-queue units without workers."""
+        now = time.monotonic()
+        for unit_id, lease in list(self.leases.items()):
+            for worker_id, deadline in list(lease.workers.items()):
+                if deadline < now:
+                    _LOGGER.warning("Worker %s lost unit %s", worker_id, unit_id)
+                    del lease.workers[worker_id]
+            if not lease.workers:
+                del self.leases[unit_id]
+                self.retry(lease.unit)
+
+    @property
+    def report(self) -> list[dict[str, Any]]:
+        """Return the results per sweep entry, with the errors of its failed units."""
+        errors: list[dict[str, Any]] = [{} for _ in self.sweep]
+        for unit_id, error in self.failed.items():
+            errors[self.units[unit_id].sweep_index][unit_id] = error
+        return [
+            {
+                "config": entry.get("config", {}),
+                "policy": entry.get("policy"),
+                "episodes": stats.count,
+                "mean": stats.mean,
+                "std": stats.std,
+                "min": stats.min,
+                "max": stats.max,
+                "failed_units": len(entry_errors),
+                "errors": entry_errors,
+            }
+            for entry, stats, entry_errors in zip(self.sweep, self.results, errors)
+        ]
+
+    @property
+    def status(self) -> dict[str, Any]:
+        """Return the progress of the sweep."""
+        return {
+            "total": self.total,
+            "pending": len(self.pending),
+            "running": len(self.leases),
+            "completed": len(self.completed),
+            "failed": len(self.failed),
+            "requeued": self.requeued,
+            "stolen": self.stolen,
+        }
+
+    def app(self) -> web.Application:
+        """Create the web app for the coordinator."""
+
+        async def work(request: web.Request) -> web.Response:
+            body = await request.json()
+            if self.done:
+                return web.json_response({"done": True})
+            unit = self.next_unit(body["worker_id"])
+            if unit is None:
+                return web.json_response({"wait": HEARTBEAT_INTERVAL})
+            return web.json_response({"unit": unit.to_dict()})
+
+        async def heartbeat(request: web.Request) -> web.Response:
+            body = await request.json()
+            self.heartbeat(body["worker_id"])
+            return web.json_response({"done": self.done})
+
+        async def result(request: web.Request) -> web.Response:
+            body = await request.json()
+            if "error" in body:
+                self.fail(body["unit_id"], body["worker_id"], body["error"])
+            else:
+                self.complete(body["unit_id"], body["costs"])
+            return web.json_response({"done": self.done})
+
+        async def status(request: web.Request) -> web.Response:
+            return web.json_response({**self.status, "results": self.report})
+
+        async def expire_loop(app: web.Application) -> Any:
+            async def loop() -> None:
+                while True:
+                    await asyncio.sleep(HEARTBEAT_INTERVAL)
+                    self.expire_leases()
+
+            task = asyncio.create_task(loop())
+            yield
+            task.cancel()
+
+        app = web.Application()
+        app.router.add_post("/work", work)
+        app.router.add_post("/heartbeat", heartbeat)
+        app.router.add_post("/result", result)
+        app.router.add_get("/status", status)
+        app.cleanup_ctx.append(expire_loop)
+        return app
+
+    async def serve(
+        self, host: str = "0.0.0.0", port: int = 8765
+    ) -> list[dict[str, Any]]:
+        """Serve the units until all are completed, returns the report."""
+        runner = web.AppRunner(self.app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        _LOGGER.info("Coordinator serving %s units on %s:%s", self.total, host, port)
+        try:
+            await self.finished.wait()
+            # give the workers the chance to hear that the sweep is done
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+        finally:
+            await runner.cleanup()
+        _LOGGER.info("Sweep done: %s", self.status)
+        return self.report
+
+
+def run_unit(unit: dict[str, Any], cache_path: str | None = None) -> dict[str, float]:
+    """Run the episodes of a unit and return the aggregated costs.
+
+    If cache_path is set, episodes are looked up in and stored to the episode cache at that path.
+    """
+    stats = RunningStats()
+    cache = EpisodeCache(cache_path) if cache_path else None
+    try:
+        for seed in range(unit["seed_start"], unit["seed_stop"]):
+            stats.update(
+                (cache.run_episode if cache is not None else run_episode)(
+                    unit["config"], seed, unit["iterations"], unit["policy"]
+                )
+            )
+    finally:
+        if cache is not None:
+            cache.close()
+    return stats.to_dict()
+
+
+async def worker(
+    url: str, worker_id: str | None = None, cache_path: str | None = None
+) -> int:
+    """Pull units from the coordinator until the sweep is done, returns the number of units run."""
+    worker_id = worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+    url = url.rstrip("/")
+    loop = asyncio.get_running_loop()
+    units = 0
+    async with aiohttp.ClientSession() as session:
+
+        async def post(path: str, body: dict[str, Any]) -> dict[str, Any]:
+            async with session.post(url + path, json=body) as response:
+                response.raise_for_status()
+                return await response.json()
+
+        async def heartbeats() -> None:
+            while True:
+                await asyncio.sleep(HEARTBEAT_INTERVAL)
+                try:
+                    await post("/heartbeat", {"worker_id": worker_id})
+                except aiohttp.ClientError as exc:
+                    _LOGGER.warning("Heartbeat failed: %s", exc)
+
+        try:
+            while True:
+                reply = await post("/work", {"worker_id": worker_id})
+                if reply.get("done"):
+                    return units
+                if "wait" in reply:
+                    await asyncio.sleep(reply["wait"])
+                    continue
+                unit = reply["unit"]
+                beat = asyncio.create_task(heartbeats())
+                try:
+                    costs = await loop.run_in_executor(None, run_unit, unit, cache_path)
+                except Exception as exc:  # pylint: disable=broad-except
+                    _LOGGER.warning("Unit %s failed: %r", unit["unit_id"], exc)
+                    await post(
+                        "/result",
+                        {
+                            "unit_id": unit["unit_id"],
+                            "worker_id": worker_id,
+                            "error": repr(exc),
+                        },
+                    )
+                    continue
+                finally:
+                    beat.cancel()
+                await post("/result", {"unit_id": unit["unit_id"], "costs": costs})
+                units += 1
+        except aiohttp.ClientError:
+            _LOGGER.info("Coordinator gone, stopping worker %s", worker_id)
+            return units
+
+
+def _worker_process(url: str, log_level: str, cache_path: str | None) -> None:
+    """Entry point of a local worker process."""
+    logging.basicConfig(level=log_level)
+    units = asyncio.run(worker(url, cache_path=cache_path))
+    _LOGGER.info("Worker ran %s units", units)
+
+
+def run_local(
+    sweep: list[dict[str, Any]],
+    workers: int = 4,
+    unit_size: int = 10,
+    port: int = 8765,
+    log_level: str = "INFO",
+    cache_path: str | None = None,
+) -> list[dict[str, Any]]:
+    """Run the coordinator and worker processes on localhost, returns the report."""
+    url = f"http://127.0.0.1:{port}"
+    processes = [
+        multiprocessing.Process(
+            target=_worker_process, args=(url, log_level, cache_path)
+        )
+        for _ in range(workers)
+    ]
+
+    async def coordinate() -> list[dict[str, Any]]:
+        coordinator = Coordinator(sweep, unit_size)
+        serving = asyncio.create_task(coordinator.serve("127.0.0.1", port))
+        await asyncio.sleep(0.5)
+        for process in processes:
+            process.start()
+        return await serving
+
+    try:
+        return asyncio.run(coordinate())
+    finally:
+        for process in processes:
+            process.join(timeout=HEARTBEAT_INTERVAL * 2)
+            if process.is_alive():
+                process.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed BeerGame evaluation.")
+    parser.add_argument(
+        "mode",
+        choices=["coordinator", "worker", "local"],
+        help="Run a coordinator, a worker, or both on localhost.",
+    )
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        help="Log level used by the logging package, defaults to info.",
+        default="INFO",
+    )
+    parser.add_argument(
+        "--sweep",
+        type=str,
+        metavar="SWEEP FILE",
+        help="JSON file with the sweep, used by the coordinator.",
+        default=None,
+    )
+    parser.add_argument(
+        "--unit-size", type=int, help="Episodes per work unit.", default=10
+    )
+    parser.add_argument(
+        "--url",
+        type=str,
+        help="Url of the coordinator, used by the worker.",
+        default="http://127.0.0.1:8765",
+    )
+    parser.add_argument("--host", type=str, help="Host to bind to.", default="0.0.0.0")
+    parser.add_argument("--port", type=int, help="Port to bind to.", default=8765)
+    parser.add_argument(
+        "--workers", type=int, help="Number of local worker processes.", default=4
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        metavar="CACHE FILE",
+        help="Episode cache used by the workers, disabled by default.",
+        default=None,
+    )
+
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper())
+
+    if args.mode == "worker":
+        asyncio.run(worker(args.url, cache_path=args.cache))
+    else:
+        sweep: list[dict[str, Any]] = [{}]
+        if args.sweep:
+            with open(args.sweep) as file:
+                sweep = json.load(file)
+        if args.mode == "coordinator":
+            report = asyncio.run(
+                Coordinator(sweep, args.unit_size).serve(args.host, args.port)
+            )
+        else:
+            report = run_local(
+                sweep,
+                args.workers,
+                args.unit_size,
+                args.port,
+                args.log_level.upper(),
+                args.cache,
+            )
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Local simulation service for on-demand queries, with a pool of warm worker processes.
+
+Each worker process imports the sim package and keeps a BeerGame instance that is reset for
+every episode, so a request does not pay for starting Python. Requests are queued and run with
+at most one episode per worker at a time, results are streamed back as one JSON line per episode.
+
+Usage:
+    python service.py --workers 4 --port 8080
+
+Endpoints:
+    POST /run with {"config": {...}, "policy": "strm", "episodes": 1, "iterations": 100, "seed": 0,
+        "action": 0, "trajectory": false}, policy is an agent type for the first agent or a policy
+        file (.npz or .onnx) that drives it. Returns application/x-ndjson, one line per episode.
+    GET /metrics returns the queue depth, the number of running episodes and the latencies.
+    GET /health
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any
+
+import numpy as np
+from aiohttp import web
+
+from sim.beer_game import BeerGame
+from sim.const import AGENT_TYPE_BONSAI, OBSERVATION_FIELDS
+from sim.evaluation import episode_config, seed_everything
+from sim.kpi import P2Quantile, RunningStats
+from sim.policy import load_policy, observe
+
+_LOGGER = logging.getLogger(__name__)
+
+# state of a worker process, kept between jobs
+_BEERGAME: BeerGame | None = None
+_POLICIES: dict[str, Any] = {}
+
+
+def _init_worker(log_level: str) -> None:
+    """Warm up a worker process, runs once when the process starts."""
+    global _BEERGAME  # pylint: disable=global-statement
+    logging.basicConfig(level=log_level)
+    _BEERGAME = BeerGame()
+    _BEERGAME.reset(seed=0)
+    for _ in range(10):
+        _BEERGAME.step(0)
+
+
+def _ping() -> int:
+    """Return the pid of the worker, used to start the processes ahead of the first request.
+
+    The short sleep keeps a worker busy, so every ping lands on a different process.
+    """
+    time.sleep(0.1)
+    return os.getpid()
+
+
+def run_job(job: dict[str, Any]) -> dict[str, Any]:
+    """Run one episode in a worker process and return its result."""
+    started = time.perf_counter()
+    beergame = _BEERGAME if _BEERGAME is not None else BeerGame()
+    policy = job.get("policy")
+    action = job.get("action", 0)
+    decide = None
+    if policy is not None and policy.endswith((".npz", ".onnx")):
+        if policy not in _POLICIES:
+            _POLICIES[policy] = load_policy(policy)
+        model = _POLICIES[policy]
+        observation = np.zeros((1, len(OBSERVATION_FIELDS)), dtype=np.float32)
+
+        def decide(sim: BeerGame) -> int:
+            observe(sim, 0, observation[0])
+            return int(model(observation)[0])
+
+        policy = AGENT_TYPE_BONSAI
+    seed_everything(job["seed"])
+    beergame.reset(**{"seed": job["seed"], **episode_config(job["config"], policy)})
+    trajectory: dict[str, list[Any]] = {}
+    for chunk in beergame.rollout(
+        decide or (lambda _: action),
+        horizon=job["iterations"],
+        chunk=max(1, job["iterations"]),
+    ):
+        if job.get("trajectory"):
+            for field, values in chunk.items():
+                trajectory.setdefault(field, []).extend(values.tolist())
+    result = {
+        "episode": job["episode"],
+        "seed": job["seed"],
+        "cumulative_costs": float(sum(agent.total_costs for agent in beergame.agents)),
+        "time": beergame.time,
+        "halt_reason": beergame.halt_reason,
+        "kpis": beergame.kpis.report,
+        "pid": os.getpid(),
+        "run_time": time.perf_counter() - started,
+    }
+    if job.get("trajectory"):
+        result["trajectory"] = trajectory
+    return result
+
+
+def expand_request(body: dict[str, Any], max_episodes: int) -> list[dict[str, Any]]:
+    """Split a request into one job per episode, at most max_episodes of them."""
+    episodes = body.get("episodes", 1)
+    if isinstance(episodes, bool) or not isinstance(episodes, int):
+        raise ValueError(f"episodes must be an integer, not {episodes!r}.")
+    if not 1 <= episodes <= max_episodes:
+        raise ValueError(
+            f"episodes must be between 1 and {max_episodes}, not {episodes}."
+        )
+    seed = body.get("seed", 0)
+    return [
+        {
+            "episode": episode,
+            "seed": seed + episode,
+            "config": body.get("config", {}),
+            "policy": body.get("policy"),
+            "iterations": body.get("iterations", 100),
+            "action": body.get("action", 0),
+            "trajectory": body.get("trajectory", False),
+        }
+        for episode in range(episodes)
+    ]
+
+
+class LatencyMetric(object):
+    """Running mean, maximum and percentiles of a duration in seconds."""
+
+    def __init__(self):
+        """Initialize the metric."""
+        self.stats = RunningStats()
+        self.quantiles = {
+            "p50": P2Quantile(0.5),
+            "p95": P2Quantile(0.95),
+            "p99": P2Quantile(0.99),
+        }
+
+    def update(self, seconds: float) -> None:
+        """Add a duration."""
+        self.stats.update(seconds)
+        for quantile in self.quantiles.values():
+            quantile.update(seconds)
+
+    @property
+    def report(self) -> dict[str, float]:
+        """Return the metric."""
+        return {
+            "count": self.stats.count,
+            "mean": self.stats.mean,
+            **{name: quantile.value for name, quantile in self.quantiles.items()},
+            "max": self.stats.max if self.stats.count else 0.0,
+        }
+
+
+class SimulationService(object):
+    """Queue requests and run their episodes on a pool of warm worker processes."""
+
+    def __init__(self, workers: int = 4, max_queue: int = 256, log_level: str = "INFO"):
+        """Create the service, the processes are started with the app."""
+        self.workers = workers
+        self.max_queue = max_queue
+        self.log_level = log_level
+        self.executor: ProcessPoolExecutor | None = None
+        self.slots = asyncio.Semaphore(workers)
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.restarts = 0
+        self.requests = 0
+        self.request_latency = LatencyMetric()
+        self.queue_wait = LatencyMetric()
+        self.run_time = LatencyMetric()
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        """Create the pool, the processes start with the first jobs."""
+        return ProcessPoolExecutor(
+            self.workers, initializer=_init_worker, initargs=(self.log_level,)
+        )
+
+    async def start(self) -> None:
+        """Start and warm up the worker processes."""
+        self.executor = self._create_pool()
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(
+            *(loop.run_in_executor(self.executor, _ping) for _ in range(self.workers))
+        )
+        _LOGGER.info("Started %s workers: %s", len(set(pids)), sorted(set(pids)))
+
+    def stop(self) -> None:
+        """Stop the worker processes."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def restart(self, executor: ProcessPoolExecutor) -> None:
+        """Replace a broken pool, unless that already happened."""
+        if self.executor is not executor:
+            return
+        _LOGGER.warning("A worker process died, restarting the pool")
+        executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = self._create_pool()
+        self.restarts += 1
+
+    async def run(self, job: dict[str, Any]) -> dict[str, Any]:
+        """Wait for a free worker and run a job, errors are returned in the result.
+
+        When the request is cancelled, the slot is held until the job is done in its worker,
+        so the number of running jobs never exceeds the number of workers.
+        """
+        enqueued = time.perf_counter()
+        self.queued += 1
+        waiting = True
+        try:
+            async with self.slots:
+                self.queued -= 1
+                waiting = False
+                self.queue_wait.update(time.perf_counter() - enqueued)
+                self.running += 1
+                executor = self.executor
+                try:
+                    future = asyncio.get_running_loop().run_in_executor(
+                        executor, run_job, job
+                    )
+                    try:
+                        result = await asyncio.shield(future)
+                    except asyncio.CancelledError:
+                        await asyncio.wait([future])
+                        if not future.cancelled() and isinstance(
+                            future.exception(), BrokenProcessPool
+                        ):
+                            self.restart(executor)
+                        raise
+                except BrokenProcessPool as exc:
+                    _LOGGER.warning("Episode %s failed: %r", job["episode"], exc)
+                    self.failed += 1
+                    self.restart(executor)
+                    return {"episode": job["episode"], "error": repr(exc)}
+                except Exception as exc:  # pylint: disable=broad-except
+                    _LOGGER.warning("Episode %s failed: %r", job["episode"], exc)
+                    self.failed += 1
+                    return {"episode": job["episode"], "error": repr(exc)}
+                finally:
+                    self.running -= 1
+        finally:
+            if waiting:
+                self.queued -= 1
+        self.completed += 1
+        self.run_time.update(result["run_time"])
+        return result
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        """Return the queue depth, counters and latencies."""
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queued,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "requests": self.requests,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+            "request_latency": self.request_latency.report,
+            "queue_wait": self.queue_wait.report,
+            "run_time": self.run_time.report,
+        }
+
+    def app(self) -> web.Application:
+        """Create the web app for the service."""
+
+        async def run(request: web.Request) -> web.StreamResponse:
+            started = time.perf_counter()
+            try:
+                body = await request.json()
+                # more episodes than the queue holds could never be accepted, so that is a 400
+                jobs = expand_request(body, self.max_queue)
+            except (ValueError, TypeError, AttributeError) as exc:
+                raise web.HTTPBadRequest(text=f"Invalid request: {exc}") from exc
+            if self.queued + len(jobs) > self.max_queue:
+                self.rejected += 1
+                raise web.HTTPServiceUnavailable(
+                    text="Queue is full.", headers={"Retry-After": "1"}
+                )
+            self.requests += 1
+            response = web.StreamResponse(
+                headers={"Content-Type": "application/x-ndjson"}
+            )
+            await response.prepare(request)
+            tasks = [asyncio.create_task(self.run(job)) for job in jobs]
+            try:
+                for next_result in asyncio.as_completed(tasks):
+                    result = await next_result
+                    await response.write((json.dumps(result) + "\n").encode())
+            except ConnectionResetError:
+                # running episodes finish in their workers and keep their slots until then
+                _LOGGER.info("Client disconnected, dropping the rest of the request")
+                return response
+            finally:
+                for task in tasks:
+                    task.cancel()
+            await response.write_eof()
+            self.request_latency.update(time.perf_counter() - started)
+            return response
+
+        async def metrics(request: web.Request) -> web.Response:
+            return web.json_response(self.metrics)
+
+        async def health(request: web.Request) -> web.Response:
+            return web.json_response(
+                {"ok": self.executor is not None, "workers": self.workers}
+            )
+
+        async def pool(app: web.Application) -> Any:
+            await self.start()
+            yield
+            self.stop()
+
+        app = web.Application()
+        app.router.add_post("/run", run)
+        app.router.add_get("/metrics", metrics)
+        app.router.add_get("/health", health)
+        app.cleanup_ctx.append(pool)
+        return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BeerGame simulation service.")
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        help="Log level used by the logging package, defaults to info.",
+        default="INFO",
+    )
+    parser.add_argument(
+        "--host", type=str, help="Host to bind to.", default="127.0.0.1"
+    )
+    parser.add_argument("--port", type=int, help="Port to bind to.", default=8080)
+    parser.add_argument(
+        "--workers", type=int, help="Number of worker processes.", default=4
+    )
+    parser.add_argument(
+        "--max-queue",
+        type=int,
+        help="Maximum number of queued episodes, requests above it are rejected.",
+        default=256,
+    )
+
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper())
+
+    service = SimulationService(args.workers, args.max_queue, args.log_level.upper())
+    web.run_app(service.app(), host=args.host, port=args.port, access_log=None)
@@ -1,7 +1,11 @@
 """The main simulation engine."""
+from __future__ import annotations
+
 import logging
-from random import randint
-from typing import Any
+from collections import deque
+from collections.abc import Callable, Iterator
+from random import randint, random
+from typing import TYPE_CHECKING, Any
 
 import numpy as np
 
@@ -9,6 +13,8 @@ from .beer_game_agent import (
     BeerGameAgent,
     BeerGameAgentBaseStock,
     BeerGameAgentBonsai,
+    BeerGameAgentDP,
+    BeerGameAgentLookahead,
     BeerGameAgentManual,
     BeerGameAgentRandom,
     BeerGameAgentSTRM,
@@ -16,13 +22,24 @@ from .beer_game_agent import (
 from .const import (
     AGENT_TYPE_BASESTOCK,
     AGENT_TYPE_BONSAI,
+    AGENT_TYPE_DP,
+    AGENT_TYPE_LOOKAHEAD,
     AGENT_TYPE_MANUAL,
     AGENT_TYPE_RANDOM,
     AGENT_TYPE_STRM,
     DEMAND_DISTRIBUTION_NORMAL,
     DEMAND_DISTRIBUTION_PATTERN,
     DEMAND_DISTRIBUTION_UNIFORM,
+    HALT_REASON_NONE,
+    ROLLOUT_FIELDS,
 )
+from .halting import HaltingRules
+from .kpi import SupplyChainKPIs
+from .random_streams import RandomStream
+from .warm_start import WarmStartLibrary, restore
+
+if TYPE_CHECKING:
+    from .scenario_bank import ScenarioBank
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -33,21 +50,49 @@ AGENTS = {
     AGENT_TYPE_RANDOM: BeerGameAgentRandom,
     AGENT_TYPE_BASESTOCK: BeerGameAgentBaseStock,
     AGENT_TYPE_MANUAL: BeerGameAgentManual,
+    AGENT_TYPE_DP: BeerGameAgentDP,
+    AGENT_TYPE_LOOKAHEAD: BeerGameAgentLookahead,
 }
 
 
 class BeerGame(object):
     """Main class for the simulation"""
 
-    def __init__(self):
-        """Initialize the game."""
+    def __init__(
+        self,
+        scenario_bank: ScenarioBank | None = None,
+        warm_start_library: WarmStartLibrary | None = None,
+    ):
+        """Initialize the game.
+
+        scenario_bank is used for resets with a scenario, warm_start_library for resets with a
+        warm start (the default library file is loaded on first use if None).
+        """
+        self.scenario_bank = scenario_bank
+        self.warm_start_library = warm_start_library
+        self.warm_start: str | None = None
+        self.scenario: int | None = None
         self.time = 0
         self.inventory_levels = [0, 0, 0, 0]
         self.arriving_orders = [0, 0, 0, 0]
         self.arriving_shipments = [0, 0, 0, 0]
         self.total_delivered: int = 0
         self.agents: list[BeerGameAgent] = []
+        self.kpis = SupplyChainKPIs(0)
+        self.seed: int | None = None
+        self.antithetic: bool = False
+        self.demand_stream: RandomStream | None = None
+        self.halting_rules = HaltingRules()
+        self.halt_reason: int = HALT_REASON_NONE
+        self.event_queue: list[
+            int
+        ] | None = None  # arrival times, kept by the event engine
+        self.demand_lookahead: deque[int] = deque()
         self.max_action: int = 61
+        self.lookahead_horizon: int = 24
+        self.lookahead_rollouts: int = 32
+        self.lookahead_budget: float = 0.0
+        self.lookahead_processes: int = 0
 
         self.demand_distribution: str = DEMAND_DISTRIBUTION_UNIFORM  # "normal"
         self.demand_low: int = 0
@@ -103,8 +148,41 @@ class BeerGame(object):
         inventory_initial: list[int] = [0, 0, 0, 0],
         arriving_orders_initial: list[int] = [0, 0, 0, 0],
         arriving_shipments_initial: list[int] = [0, 0, 0, 0],
+        seed: int | None = None,
+        antithetic: bool = False,
+        halt_backlog: float = 0,
+        halt_inventory: float = 0,
+        halt_cost_baseline: float = 0,
+        halt_cost_factor: float = 0,
+        halt_order_factor: float = 0,
+        scenario: int | None = None,
+        warm_start: str | None = None,
+        lookahead_horizon: int = 24,
+        lookahead_rollouts: int = 32,
+        lookahead_budget: float = 0.0,
+        lookahead_processes: int = 0,
     ) -> None:
-        """Reset the sim."""
+        """Reset the sim.
+
+        If seed is set, demand and lead times are drawn from their own random streams,
+        so episodes with the same seed see the same realizations whatever the agents do
+        (common random numbers), antithetic mirrors those draws.
+        Otherwise the global random number generators are used.
+        The halt_* values configure the HaltingRules, 0 disables a rule.
+        If scenario is set, the draws and the initial state come from that scenario in the scenario bank.
+        If warm_start is set, the episode starts from one of the steady-state snapshots stored under
+        that key in the warm start library, instead of the initial inventory and pipelines.
+        The lookahead_* values configure the lookahead agents: the steps per rollout, the rollouts per
+        round, the time budget per decision in seconds (0 runs one round) and the worker processes.
+        """
+        if scenario is not None:
+            if self.scenario_bank is None:
+                raise ValueError("A scenario can only be used with a scenario bank.")
+            initial_state = self.scenario_bank.initial_state(scenario)
+            inventory_initial = initial_state["inventory_initial"]
+            arriving_orders_initial = initial_state["arriving_orders_initial"]
+            arriving_shipments_initial = initial_state["arriving_shipments_initial"]
+        self.scenario = scenario
         self.time = 0
         self.inventory_levels = inventory_initial
         self.arriving_orders = arriving_orders_initial
@@ -131,6 +209,23 @@ class BeerGame(object):
         self.leadtime_receiving_high = leadtime_receiving_high
         self.leadtime_orders_low = leadtime_orders_low
         self.leadtime_orders_high = leadtime_orders_high
+        self.seed = seed
+        self.antithetic = antithetic
+        self.demand_stream = self.random_stream("demand")
+        self.halting_rules = HaltingRules(
+            backlog=halt_backlog,
+            inventory=halt_inventory,
+            cost_baseline=halt_cost_baseline,
+            cost_factor=halt_cost_factor,
+            order_factor=halt_order_factor,
+        )
+        self.halt_reason = HALT_REASON_NONE
+        self.lookahead_horizon = lookahead_horizon
+        self.lookahead_rollouts = lookahead_rollouts
+        self.lookahead_budget = lookahead_budget
+        self.lookahead_processes = lookahead_processes
+        self.event_queue = None
+        self.demand_lookahead = deque()
 
         self.max_action = int(
             max(
@@ -140,6 +235,23 @@ class BeerGame(object):
         )
 
         self.create_agents()
+        self.warm_start = warm_start or None
+        if self.warm_start is not None:
+            self.apply_warm_start(self.warm_start)
+        self.kpis = SupplyChainKPIs(self.num_agents)
+
+    def apply_warm_start(self, key: str) -> None:
+        """Restore one of the snapshots stored under key, picked with the seed if set."""
+        if self.warm_start_library is None:
+            self.warm_start_library = WarmStartLibrary()
+        snapshots = self.warm_start_library.snapshots(key)
+        if self.seed is not None:
+            choice = RandomStream(self.seed, "warm_start", self.antithetic).uniform()
+        elif self.scenario is not None:
+            choice = (self.scenario % len(snapshots)) / len(snapshots)
+        else:
+            choice = random()
+        restore(self, snapshots[min(int(choice * len(snapshots)), len(snapshots) - 1)])
 
     @property
     def manufacturing_agent_num(self) -> int:
@@ -170,6 +282,8 @@ class BeerGame(object):
         _LOGGER.debug("Increasing time")
         self.time += 1
         _LOGGER.debug("Time is now: %s", self.time)
+        for agent in self.agents:
+            agent.forget_history(self.time)
         _LOGGER.debug("Receiving Incoming Shipments")
         for agent in self.agents:
             agent.receive_items(self.time)
@@ -182,6 +296,15 @@ class BeerGame(object):
         _LOGGER.debug("Updating costs")
         for agent in self.agents:
             agent.update_costs()
+            agent.update_windows()
+        self.kpis.update(self.agents)
+        if self.halt_reason == HALT_REASON_NONE:
+            self.halt_reason = self.halting_rules.check(self)
+
+    @property
+    def halted(self) -> bool:
+        """Return True if one of the halting rules was triggered this episode."""
+        return self.halt_reason != HALT_REASON_NONE
 
     @property
     def state(self) -> dict[str, Any]:
@@ -196,24 +319,105 @@ class BeerGame(object):
             "supplier_orders_to_be_delivered": [
                 a["supplier_orders_to_be_delivered"] for a in states
             ],
+            "arriving_shipments": [a["arriving_shipments"] for a in states],
+            "arriving_orders": [a["arriving_orders"] for a in states],
+            "recent_demand": [a["recent_demand"] for a in states],
+            "recent_orders": [a["recent_orders"] for a in states],
+            "recent_shipments": [a["recent_shipments"] for a in states],
+            "recent_pipeline": [a["recent_pipeline"] for a in states],
             "current_costs": [a["current_costs"] for a in states],
             "total_costs": [a["total_costs"] for a in states],
             "cumulative_costs": sum([a["total_costs"] for a in states]),
             "total_delivered": self.total_delivered,
             "outstanding_demand": self.outstanding_demand,
             "time": self.time,
+            "halt_reason": self.halt_reason,
+            **self.kpis.state,
         }
 
+    def rollout(
+        self,
+        policy: Callable[["BeerGame"], int] | None = None,
+        horizon: int = 1000,
+        chunk: int = 10000,
+    ) -> Iterator[dict[str, np.ndarray]]:
+        """Run the sim for horizon steps and yield the results in chunks.
+
+        Each chunk is a dict with a `time` array of shape (n,) and an array of shape (n, num_agents)
+        for each of the ROLLOUT_FIELDS, with n equal to chunk except for the last one.
+        Only one chunk is kept in memory, so long horizons can be streamed to the consumer.
+
+        Args:
+            policy: callable that gets the sim and returns the action, if None the action is 0.
+            horizon: number of steps to run, nothing is yielded if it is not positive.
+            chunk: number of steps per chunk, at least 1.
+        """
+        assert self.agents
+        if chunk < 1:
+            raise ValueError(f"The chunk size must be at least 1, not {chunk}.")
+        agents = self.agents
+        for start in range(0, horizon, chunk):
+            size = min(chunk, horizon - start)
+            times = np.empty(size, dtype=np.int64)
+            fields = {
+                field: np.empty((size, self.num_agents), dtype=np.float64)
+                for field in ROLLOUT_FIELDS
+            }
+            inventory_levels = fields["inventory_levels"]
+            customer_orders = fields["customer_orders_to_be_filled"]
+            supplier_orders = fields["supplier_orders_to_be_delivered"]
+            orders = fields["orders"]
+            current_costs = fields["current_costs"]
+            for row in range(size):
+                self.step(policy(self) if policy else 0)
+                times[row] = self.time
+                for num, agent in enumerate(agents):
+                    inventory_levels[row, num] = agent.inventory_level
+                    customer_orders[row, num] = agent.customer_orders_to_be_filled
+                    supplier_orders[row, num] = agent.supplier_orders_to_be_delivered
+                    orders[row, num] = agent.last_order
+                    current_costs[row, num] = agent.current_costs
+            yield {"time": times, **fields}
+
+    def random_stream(self, name: str) -> RandomStream | None:
+        """Return the random stream with name for the current scenario or seed, None if neither is set."""
+        if self.scenario is not None and self.scenario_bank is not None:
+            return self.scenario_bank.stream(self.scenario, name, self.antithetic)
+        if self.seed is None:
+            return None
+        return RandomStream(self.seed, name, self.antithetic)
+
     def new_demand(self) -> int:
         """Get a new demand."""
+        if self.demand_lookahead:
+            return self.demand_lookahead.popleft()
+        return self.draw_demand(self.time)
+
+    def peek_demand(self, count: int) -> deque[int]:
+        """Draw the demand of the next count steps ahead, new_demand will return those first.
+
+        Only use this with a seeded sim, otherwise the draws are mixed with other uses of the global generators.
+        """
+        while len(self.demand_lookahead) < count:
+            self.demand_lookahead.append(
+                self.draw_demand(self.time + len(self.demand_lookahead))
+            )
+        return self.demand_lookahead
+
+    def draw_demand(self, time: int) -> int:
+        """Draw the demand for time."""
         if self.demand_distribution == DEMAND_DISTRIBUTION_NORMAL:
+            if self.demand_stream is not None:
+                return int(self.demand_stream.normal(self.demand_mu, self.demand_sigma))
             return int(np.random.normal(self.demand_mu, self.demand_sigma))
         if self.demand_distribution == DEMAND_DISTRIBUTION_PATTERN:
             return (
                 self.demand_low
-                if self.time < self.demand_pattern_step_time
+                if time < self.demand_pattern_step_time
                 else self.demand_high
             )
+        if self.demand_stream is not None:
+            return self.demand_stream.randint(self.demand_low, self.demand_high)
         return randint(self.demand_low, self.demand_high)
 
     def create_agents(self) -> None:
@@ -3,6 +3,8 @@ from __future__ import annotations
 
 import logging
 from abc import abstractmethod
+from collections import deque
+from heapq import heappush
 from random import randint
 from statistics import mean
 from typing import TYPE_CHECKING
@@ -10,14 +12,19 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from .beer_game import BeerGame
 
+from . import lookahead
 from .const import (
     AGENT_TYPE_BASESTOCK,
     AGENT_TYPE_BONSAI,
+    AGENT_TYPE_DP,
+    AGENT_TYPE_LOOKAHEAD,
     AGENT_TYPE_MANUAL,
     AGENT_TYPE_RANDOM,
     AGENT_TYPE_STRM,
     DEMAND_DISTRIBUTION_NORMAL,
+    HISTORY_WINDOW,
 )
+from .dp_solver import policy_table
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -25,6 +32,9 @@ _LOGGER = logging.getLogger(__name__)
 class BeerGameAgent(object):
     """Here we want to define the agent class for the BeerGame"""
 
+    # True if decide_order only depends on the current state (and action), not on time or randomness
+    decides_on_state: bool = False
+
     def __init__(
         self,
         sim: "BeerGame",
@@ -45,6 +55,9 @@ class BeerGameAgent(object):
         self.arriving_shipments = {}  # from supplier
         self.arriving_orders = {}  # from customer
         self.previous_orders = {}
+        self.last_order = 0  # placed this step
+        self.last_demand = 0  # received from customer this step
+        self.last_delivered = 0  # delivered to customer this step
 
         if self.agent_num > 0:
             for i in range(self.sim.leadtime_orders_low[self.agent_num - 1]):
@@ -55,6 +68,14 @@ class BeerGameAgent(object):
         for i in range(self.sim.leadtime_receiving_low[self.agent_num]):
             if i > 0:
                 self.arriving_shipments[i] = self.sim.arriving_shipments[self.agent_num]
+        # running totals of what is on the way and windows of the last steps, updated in O(1)
+        self.shipments_in_transit = sum(self.arriving_shipments.values())
+        self.orders_in_transit = sum(self.arriving_orders.values())
+        self.last_received = 0  # received from supplier this step
+        self.recent_demand = deque([0] * HISTORY_WINDOW, maxlen=HISTORY_WINDOW)
+        self.recent_orders = deque([0] * HISTORY_WINDOW, maxlen=HISTORY_WINDOW)
+        self.recent_shipments = deque([0] * HISTORY_WINDOW, maxlen=HISTORY_WINDOW)
+        self.recent_pipeline = deque([0] * HISTORY_WINDOW, maxlen=HISTORY_WINDOW)
         self.c_h = self.sim.costs_holding[self.agent_num]
         self.c_p = self.sim.costs_shortage[self.agent_num]
 
@@ -67,6 +88,15 @@ class BeerGameAgent(object):
             self.sim.leadtime_receiving_high[self.agent_num],
         )
 
+        self.receiving_stream = self.sim.random_stream(f"receiving_{self.agent_num}")
+        self.orders_stream = self.sim.random_stream(f"orders_{self.agent_num}")
+        self.randint_receiving = (
+            self.receiving_stream.randint if self.receiving_stream else randint
+        )
+        self.randint_orders = (
+            self.orders_stream.randint if self.orders_stream else randint
+        )
+
         self.a_b, self.b_b = self.set_a_b_values(
             float(mean((self.leadtime_receiving)) + mean((self.leadtime_orders)))
         )
@@ -75,6 +105,7 @@ class BeerGameAgent(object):
         """Handle the order of the agent"""
         order = min(self.decide_order(time, action), self.sim.max_action)
         self.previous_orders[time] = order
+        self.last_order = order
         self.supplier_orders_to_be_delivered += order
         if self.supplier is not None:
             self.supplier.plan_order(time, order)
@@ -84,49 +115,100 @@ class BeerGameAgent(object):
     def receive_items(self, time):
         """Updates the IL and customer_orders_to_be_filled at time t, after recieving "rec" number of items"""
         shipment = self.arriving_shipments.get(time, 0)
+        self.last_received = shipment
+        self.shipments_in_transit -= shipment
         self.inventory_level += shipment
         self.supplier_orders_to_be_delivered -= shipment
 
     def receive_order(self, time):
         """Updates the customer_orders_to_be_filled at time t, after recieving orders"""
-        self.customer_orders_to_be_filled += self.arriving_orders.get(time, 0)
+        self.last_demand = self.arriving_orders.get(time, 0)
+        self.orders_in_transit -= self.last_demand
+        self.customer_orders_to_be_filled += self.last_demand
 
     def deliver_items(self, time):
         """Updates the backorder at time t, after delivering "del" number of items"""
         possible_shipment = min(self.inventory_level, self.customer_orders_to_be_filled)
         self.inventory_level -= possible_shipment
         self.customer_orders_to_be_filled -= possible_shipment
+        self.last_delivered = possible_shipment
         if self.customer is not None:
             self.customer.plan_shipment(time, possible_shipment)
             return
         self.sim.total_delivered += possible_shipment
         self.sim.outstanding_demand -= possible_shipment
 
+    @property
+    def state_costs(self) -> float:
+        """Return the holding and backorder costs of one time unit in the current state."""
+        return self.c_p * max(0, self.customer_orders_to_be_filled) + self.c_h * max(
+            0, self.inventory_level
+        )
+
     def update_costs(self):
         """Update total_costs returns the total_costs at the current state"""
         # cost (holding + backorder) for one time unit
-        self.current_costs = self.c_p * max(
-            0, self.customer_orders_to_be_filled
-        ) + self.c_h * max(0, self.inventory_level)
+        self.current_costs = self.state_costs
         self.total_costs += self.current_costs
 
+    def update_windows(self) -> None:
+        """Add this step to the windows of recent demand, orders, shipments and pipeline."""
+        self.recent_demand.append(self.last_demand)
+        self.recent_orders.append(self.last_order)
+        self.recent_shipments.append(self.last_received)
+        self.recent_pipeline.append(self.shipments_in_transit)
+
     def plan_shipment(self, time: int, amount: int) -> None:
         """Add a shipment to arriving shipments."""
+        self.shipments_in_transit += amount
         if (
-            shipment_time := time + randint(*self.leadtime_receiving) + 1
+            shipment_time := time + self.randint_receiving(*self.leadtime_receiving) + 1
         ) in self.arriving_shipments:
             self.arriving_shipments[shipment_time] += amount
         else:
             self.arriving_shipments[shipment_time] = amount
+        if amount and self.sim.event_queue is not None:
+            heappush(self.sim.event_queue, shipment_time)
 
     def plan_order(self, time: int, amount: int) -> None:
         """Add an order to arriving orders."""
+        self.orders_in_transit += amount
         if (
-            order_time := time + randint(*self.leadtime_orders) + 1
+            order_time := time + self.randint_orders(*self.leadtime_orders) + 1
         ) in self.arriving_orders:
             self.arriving_orders[order_time] += amount
         else:
             self.arriving_orders[order_time] = amount
+        if amount and self.sim.event_queue is not None:
+            heappush(self.sim.event_queue, order_time)
+
+    def forget_history(self, time: int) -> None:
+        """Drop the entries that have fallen out of the history window, keeps memory bounded."""
+        expired = time - HISTORY_WINDOW - 1
+        self.arriving_shipments.pop(expired, None)
+        self.arriving_orders.pop(expired, None)
+        self.previous_orders.pop(expired, None)
+
+    def skip_idle(self, periods: int) -> None:
+        """Account for idle periods without stepping, the sim time is already moved forward.
+
+        In an idle period nothing arrives, nothing is ordered or delivered, so the costs of the
+        state repeat and each random stream is drawn from once, for the lead time of an order of 0.
+        The costs are computed from the state, current_costs is stale after a reset or a warm start.
+        """
+        self.current_costs = self.state_costs
+        self.total_costs += periods * self.current_costs
+        if self.receiving_stream is not None:
+            self.receiving_stream.skip(periods)
+        if self.orders_stream is not None:
+            self.orders_stream.skip(periods)
+        for history in (
+            self.arriving_shipments,
+            self.arriving_orders,
+            self.previous_orders,
+        ):
+            for key in [key for key in history if key < self.sim.time - HISTORY_WINDOW]:
+                del history[key]
 
     @property
     def state(self):
@@ -150,6 +232,12 @@ class BeerGameAgent(object):
             "supplier_orders_to_be_delivered": self.supplier_orders_to_be_delivered,
             "current_costs": self.current_costs,
             "total_costs": self.total_costs,
+            "arriving_shipments": self.shipments_in_transit,
+            "arriving_orders": self.orders_in_transit,
+            "recent_demand": list(self.recent_demand),
+            "recent_orders": list(self.recent_orders),
+            "recent_shipments": list(self.recent_shipments),
+            "recent_pipeline": list(self.recent_pipeline),
         }
 
     @property
@@ -193,7 +281,7 @@ class BeerGameAgent(object):
         return {
             (key - self.sim.time): val
             for key, val in self.arriving_shipments.items()
-            if self.sim.time - 4 <= key <= self.sim.time
+            if self.sim.time - HISTORY_WINDOW <= key <= self.sim.time
         }
 
     @property
@@ -202,7 +290,7 @@ class BeerGameAgent(object):
         return {
             (key - self.sim.time): val
             for key, val in self.arriving_orders.items()
-            if self.sim.time - 4 <= key <= self.sim.time
+            if self.sim.time - HISTORY_WINDOW <= key <= self.sim.time
         }
 
     @property
@@ -211,7 +299,7 @@ class BeerGameAgent(object):
         return {
             (key - self.sim.time): val
             for key, val in self.previous_orders.items()
-            if self.sim.time - 4 <= key <= self.sim.time
+            if self.sim.time - HISTORY_WINDOW <= key <= self.sim.time
         }
 
     @abstractmethod
@@ -222,6 +310,8 @@ class BeerGameAgent(object):
 class BeerGameAgentBonsai(BeerGameAgent):
     """Class for Bonsai Agent."""
 
+    decides_on_state = True
+
     def __init__(
         self,
         sim: "BeerGame",
@@ -244,6 +334,8 @@ class BeerGameAgentBonsai(BeerGameAgent):
 class BeerGameAgentSTRM(BeerGameAgent):
     """Class for STRM agent."""
 
+    decides_on_state = True
+
     def __init__(
         self,
         sim: "BeerGame",
@@ -304,6 +396,58 @@ class BeerGameAgentBaseStock(BeerGameAgent):
         )
 
 
+class BeerGameAgentDP(BeerGameAgent):
+    """Class for the agent with the optimal policy of its own single-echelon problem."""
+
+    decides_on_state = True
+
+    def __init__(
+        self,
+        sim: "BeerGame",
+        agent_num: int,
+    ):
+        """Initializes the DP agent class, solves the policy if it is not cached yet."""
+        super().__init__(
+            sim,
+            agent_num,
+            AGENT_TYPE_DP,
+        )
+        self.policy = policy_table(self.sim, self.agent_num)
+
+    @property
+    def inventory_position(self) -> int:
+        """Return the inventory minus the backlog plus everything on order."""
+        return (
+            self.inventory_level
+            - self.customer_orders_to_be_filled
+            + self.supplier_orders_to_be_delivered
+        )
+
+    def decide_order(self, time: int, action: int | None = None) -> int:
+        """Updates the action of the agent"""
+        return self.policy.order(self.inventory_position)
+
+
+class BeerGameAgentLookahead(BeerGameAgent):
+    """Class for the agent that plans its orders with Monte-Carlo rollouts of the chain."""
+
+    def __init__(
+        self,
+        sim: "BeerGame",
+        agent_num: int,
+    ):
+        """Initializes the lookahead agent class."""
+        super().__init__(
+            sim,
+            agent_num,
+            AGENT_TYPE_LOOKAHEAD,
+        )
+
+    def decide_order(self, time: int, action: int | None = None) -> int:
+        """Updates the action of the agent"""
+        return lookahead.plan_order(self.sim, self.agent_num)
+
+
 class BeerGameAgentRandom(BeerGameAgent):
     """Class for random agent."""
 
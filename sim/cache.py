@@ -0,0 +1,170 @@
+"""Content-addressed on-disk cache of episode results."""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections.abc import Mapping
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from .evaluation import episode_config, reset_defaults, run_episode
+from .warm_start import DEFAULT_LIBRARY_PATH, WarmStartLibrary
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def code_version() -> str:
+    """Return a hash of the source of the sim package, changes whenever the engine changes."""
+    digest = hashlib.sha256()
+    for path in sorted(Path(__file__).parent.glob("*.py")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+@lru_cache(maxsize=64)
+def _warm_start_digest(key: str, path: str, modified: int | None) -> str:
+    """Return the digest of a warm start, cached per version of the library file."""
+    return WarmStartLibrary(path).digest(key)
+
+
+def warm_start_digest(key: str, path: str | Path = DEFAULT_LIBRARY_PATH) -> str:
+    """Return a hash of the snapshots of a warm start in the library at path."""
+    path = Path(path)
+    modified = path.stat().st_mtime_ns if path.exists() else None
+    return _warm_start_digest(key, str(path), modified)
+
+
+def episode_key(
+    config: Mapping[str, Any],
+    seed: int,
+    iterations: int,
+    policy: str | None = None,
+    action: int = 0,
+) -> str:
+    """Return the stable key of an episode.
+
+    The config is normalized by filling in the reset defaults, so an empty config and
+    one that spells out the defaults share the same key. Episodes with a warm start also
+    key on the snapshots in the default library, so rebuilding it invalidates them.
+    """
+    normalized = {**reset_defaults(), **episode_config(config, policy)}
+    key = {
+        "config": normalized,
+        "seed": seed,
+        "iterations": iterations,
+        "action": action,
+        "code_version": code_version(),
+    }
+    if normalized.get("warm_start"):
+        key["warm_start_snapshots"] = warm_start_digest(normalized["warm_start"])
+    payload = json.dumps(key, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class EpisodeCache(object):
+    """SQLite backed cache of episode results, evicts the least recently used above max_bytes."""
+
+    def __init__(
+        self, path: str | Path = ".episode_cache.sqlite", max_bytes: int = 64 * 2**20
+    ):
+        """Open or create the cache."""
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._connection = sqlite3.connect(self.path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS episodes ("
+            "key TEXT PRIMARY KEY, record TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS episodes_last_access ON episodes (last_access)"
+        )
+        self._connection.commit()
+
+    def close(self) -> None:
+        """Close the cache."""
+        self._connection.close()
+
+    def __enter__(self) -> EpisodeCache:
+        """Use the cache as a context manager."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Close the cache."""
+        self.close()
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """Return the record for key, or None."""
+        row = self._connection.execute(
+            "SELECT record FROM episodes WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._connection.execute(
+            "UPDATE episodes SET last_access = ? WHERE key = ?", (time.time(), key)
+        )
+        self._connection.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, record: Mapping[str, Any]) -> None:
+        """Store the record for key and evict the least recently used records if needed."""
+        data = json.dumps(record)
+        self._connection.execute(
+            "INSERT OR REPLACE INTO episodes (key, record, size, last_access) VALUES (?, ?, ?, ?)",
+            (key, data, len(data) + len(key), time.time()),
+        )
+        self._evict()
+        self._connection.commit()
+
+    @property
+    def size(self) -> int:
+        """Return the size of the stored records in bytes."""
+        return self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM episodes"
+        ).fetchone()[0]
+
+    def __len__(self) -> int:
+        """Return the number of stored records."""
+        return self._connection.execute("SELECT COUNT(*) FROM episodes").fetchone()[0]
+
+    def _evict(self) -> None:
+        """Delete the least recently used records until the cache fits in max_bytes."""
+        excess = self.size - self.max_bytes
+        if excess <= 0:
+            return
+        evicted = 0
+        for key, size in self._connection.execute(
+            "SELECT key, size FROM episodes ORDER BY last_access"
+        ).fetchall():
+            if excess <= 0:
+                break
+            self._connection.execute("DELETE FROM episodes WHERE key = ?", (key,))
+            excess -= size
+            evicted += 1
+        _LOGGER.debug("Evicted %s records", evicted)
+
+    def run_episode(
+        self,
+        config: Mapping[str, Any],
+        seed: int,
+        iterations: int = 100,
+        policy: str | None = None,
+        action: int = 0,
+    ) -> float:
+        """Return the cumulative costs of an episode, from the cache if possible."""
+        key = episode_key(config, seed, iterations, policy, action)
+        if (record := self.get(key)) is not None:
+            return record["cumulative_costs"]
+        costs = run_episode(config, seed, iterations, policy, action)
+        self.put(key, {"cumulative_costs": costs})
+        return costs
@@ -6,7 +6,36 @@ AGENT_TYPE_BONSAI: Final = "bonsai"
 AGENT_TYPE_RANDOM: Final = "random"
 AGENT_TYPE_BASESTOCK: Final = "basestock"
 AGENT_TYPE_MANUAL: Final = "manual"
+AGENT_TYPE_DP: Final = "dp"
+AGENT_TYPE_LOOKAHEAD: Final = "lookahead"
 
 DEMAND_DISTRIBUTION_UNIFORM: Final = "uniform"
 DEMAND_DISTRIBUTION_NORMAL: Final = "normal"
 DEMAND_DISTRIBUTION_PATTERN: Final = "pattern"
+
+HISTORY_WINDOW: Final = 4
+
+HALT_REASON_NONE: Final = 0
+HALT_REASON_BACKLOG: Final = 1
+HALT_REASON_INVENTORY: Final = 2
+HALT_REASON_COSTS: Final = 3
+HALT_REASON_ORDERS: Final = 4
+
+ROLLOUT_FIELDS: Final = (
+    "inventory_levels",
+    "customer_orders_to_be_filled",
+    "supplier_orders_to_be_delivered",
+    "orders",
+    "current_costs",
+)
+
+OBSERVATION_FIELDS: Final = (
+    "inventory_level",
+    "customer_orders_to_be_filled",
+    "supplier_orders_to_be_delivered",
+    "arriving_shipments",
+    "arriving_orders",
+    "current_costs",
+    "total_costs",
+    "time",
+)
@@ -0,0 +1,229 @@
+"""Exact optimal ordering policies for small configs, solved with value iteration.
+
+The chain is decomposed into single-echelon problems: each agent faces the customer demand of the
+config and a reliable supplier, so an order arrives after the order lead time of the supplier plus
+the shipping lead time of the agent. With linear holding and backlog costs the state of inventory
+and pipeline reduces to the inventory position (inventory - backlog + everything on order), and an
+order placed now only changes the costs once it has arrived, after the demand over the lead time.
+This makes the problem exact for fixed lead times, random lead times are mixed into the lead time
+demand. Value iteration then runs over the whole grid of inventory positions and orders at once.
+
+Solved tables are cached in memory and in a directory on disk, keyed by the inputs of the solver.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from statistics import NormalDist
+from typing import TYPE_CHECKING, Any, BinaryIO
+
+import numpy as np
+
+from .const import DEMAND_DISTRIBUTION_NORMAL, DEMAND_DISTRIBUTION_UNIFORM
+
+if TYPE_CHECKING:
+    from .beer_game import BeerGame
+
+_LOGGER = logging.getLogger(__name__)
+
+SOLVER_VERSION = 1
+DEFAULT_POLICY_DIR = ".dp_policies"
+DISCOUNT = 0.99
+
+_TABLES: dict[str, DPPolicy] = {}
+
+
+def demand_probabilities(sim: BeerGame) -> np.ndarray:
+    """Return the probabilities of the demands 0, 1, 2, ... of the customer.
+
+    Normal demand is truncated to an int by the sim and the (tiny) mass of negative demands is put on 0.
+    """
+    if sim.demand_distribution == DEMAND_DISTRIBUTION_UNIFORM:
+        probabilities = np.zeros(sim.demand_high + 1)
+        probabilities[sim.demand_low :] = 1 / (sim.demand_high - sim.demand_low + 1)
+        return probabilities
+    if sim.demand_distribution == DEMAND_DISTRIBUTION_NORMAL:
+        distribution = NormalDist(sim.demand_mu, max(sim.demand_sigma, 1e-9))
+        high = max(1, int(sim.demand_mu + 5 * sim.demand_sigma) + 1)
+        # int() truncates towards 0, so 0 collects (-1, 1) and k > 0 collects [k, k + 1)
+        edges = [distribution.cdf(float(value)) for value in range(1, high + 1)]
+        probabilities = np.diff([0.0, *edges])
+        probabilities[-1] += 1 - edges[-1]
+        return probabilities / probabilities.sum()
+    raise ValueError(
+        f"The DP solver needs stationary demand, not '{sim.demand_distribution}'."
+    )
+
+
+def _uniform(low: int, high: int) -> np.ndarray:
+    """Return the probabilities of 0, 1, ..., high for a uniform integer in [low, high]."""
+    probabilities = np.zeros(high + 1)
+    probabilities[low:] = 1 / (high - low + 1)
+    return probabilities
+
+
+def lead_time_probabilities(sim: BeerGame, agent_num: int) -> np.ndarray:
+    """Return the probabilities of the number of steps between placing an order and receiving it.
+
+    The shipping lead time is drawn when the shipment leaves and arrives one step later, an order to
+    a supplier also travels for the order lead time of the supplier and one step.
+    """
+    probabilities = _uniform(
+        sim.leadtime_receiving_low[agent_num], sim.leadtime_receiving_high[agent_num]
+    )
+    delay = 1
+    if agent_num < sim.num_agents - 1:
+        probabilities = np.convolve(
+            probabilities,
+            _uniform(
+                sim.leadtime_orders_low[agent_num + 1],
+                sim.leadtime_orders_high[agent_num + 1],
+            ),
+        )
+        delay = 2
+    return np.concatenate([np.zeros(delay), probabilities])
+
+
+def lead_time_demand(demand: np.ndarray, lead_time: np.ndarray) -> np.ndarray:
+    """Return the probabilities of the total demand over the lead time."""
+    total = np.zeros((len(demand) - 1) * (len(lead_time) - 1) + 1)
+    power = np.ones(1)
+    for probability in lead_time:
+        if probability:
+            total[: len(power)] += probability * power
+        power = np.convolve(power, demand)
+    return total
+
+
+def solver_inputs(sim: BeerGame, agent_num: int) -> dict[str, Any]:
+    """Return everything the policy of an agent depends on."""
+    return {
+        "version": SOLVER_VERSION,
+        "demand": demand_probabilities(sim).round(12).tolist(),
+        "lead_time": lead_time_probabilities(sim, agent_num).round(12).tolist(),
+        "holding": sim.costs_holding[agent_num],
+        "shortage": sim.costs_shortage[agent_num],
+        "max_order": sim.max_action,
+        "discount": DISCOUNT,
+    }
+
+
+def policy_key(inputs: dict[str, Any]) -> str:
+    """Return the cache key of the solver inputs."""
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class DPPolicy(object):
+    """Optimal order per inventory position, for the positions lower to lower + len(orders) - 1."""
+
+    def __init__(self, lower: int, orders: np.ndarray):
+        """Create the policy from a solved table."""
+        self.lower = lower
+        self.orders = np.asarray(orders, dtype=np.int64)
+
+    def order(self, inventory_position: int) -> int:
+        """Return the order for an inventory position, below the table the order grows with the gap."""
+        index = inventory_position - self.lower
+        if index < 0:
+            return int(self.orders[0]) - index
+        return int(self.orders[min(index, len(self.orders) - 1)])
+
+    def save(self, path: str | Path | BinaryIO) -> None:
+        """Save the table to an .npz file."""
+        np.savez(path, lower=self.lower, orders=self.orders)
+
+    @classmethod
+    def load(cls, path: str | Path) -> DPPolicy:
+        """Load a table saved with save."""
+        with np.load(path) as data:
+            return cls(int(data["lower"]), data["orders"])
+
+
+def solve(
+    demand: np.ndarray,
+    lead_time: np.ndarray,
+    holding: float,
+    shortage: float,
+    max_order: int,
+    discount: float = DISCOUNT,
+    tolerance: float = 1e-6,
+    max_iterations: int = 100000,
+) -> DPPolicy:
+    """Run value iteration over the inventory positions and return the optimal policy.
+
+    Args:
+        demand: the probabilities of the demands 0, 1, 2, ... per step.
+        lead_time: the probabilities of the lead times 0, 1, 2, ... of an order.
+        holding: the holding cost per unit per step.
+        shortage: the backlog cost per unit per step.
+        max_order: the largest order.
+        discount: the discount factor per step.
+        tolerance: stop when no value changes more than this.
+        max_iterations: the maximum number of iterations.
+    """
+    total = lead_time_demand(demand, lead_time)
+    max_demand = len(demand) - 1
+    # below the grid the policy is extrapolated, above it nothing is ordered
+    upper = len(total) + max_demand
+    lower = -upper - max_order
+    positions = np.arange(lower, upper + max_order + 1)
+    # expected costs once an order placed at position y has arrived, with y - lead time demand left
+    net = positions[:, None] - np.arange(len(total))[None, :]
+    costs = (holding * np.maximum(net, 0) + shortage * np.maximum(-net, 0)) @ total
+    states = upper - lower + 1
+    following = np.clip(
+        positions[:, None] - lower - np.arange(max_demand + 1)[None, :], 0, states - 1
+    )
+    choices = np.arange(states)[:, None] + np.arange(max_order + 1)[None, :]
+    values = np.zeros(states)
+    for iteration in range(max_iterations):
+        after_order = costs + discount * (values[following] @ demand)
+        action_values = after_order[choices]
+        new_values = action_values.min(axis=1)
+        change = np.max(np.abs(new_values - values))
+        values = new_values
+        if change < tolerance:
+            break
+    else:
+        _LOGGER.warning("Value iteration did not converge, change %s", change)
+    _LOGGER.debug("Value iteration converged after %s iterations", iteration + 1)
+    return DPPolicy(lower, action_values.argmin(axis=1))
+
+
+def policy_table(
+    sim: BeerGame, agent_num: int, directory: str | Path = DEFAULT_POLICY_DIR
+) -> DPPolicy:
+    """Return the optimal policy of an agent, from the cache or solved and cached."""
+    inputs = solver_inputs(sim, agent_num)
+    key = policy_key(inputs)
+    if key in _TABLES:
+        return _TABLES[key]
+    path = Path(directory) / f"{key}.npz"
+    if path.exists():
+        policy = DPPolicy.load(path)
+    else:
+        policy = solve(
+            np.array(inputs["demand"]),
+            np.array(inputs["lead_time"]),
+            inputs["holding"],
+            inputs["shortage"],
+            inputs["max_order"],
+            inputs["discount"],
+        )
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write next to the table and rename, so concurrent readers never see a partial file
+        handle, temporary = tempfile.mkstemp(suffix=".npz", dir=path.parent)
+        try:
+            with os.fdopen(handle, "wb") as file:
+                policy.save(file)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        _LOGGER.info("Solved the policy of agent %s, cached as %s", agent_num, path)
+    _TABLES[key] = policy
+    return policy
@@ -0,0 +1,166 @@
+"""Helpers for running seeded evaluation episodes outside of Bonsai."""
+from __future__ import annotations
+
+import inspect
+import logging
+import math
+import random
+from collections.abc import Mapping
+from statistics import NormalDist
+from typing import Any
+
+import numpy as np
+
+from .beer_game import BeerGame
+from .kpi import RunningStats
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def reset_defaults() -> dict[str, Any]:
+    """Return the default values of the BeerGame.reset config."""
+    return {
+        name: parameter.default
+        for name, parameter in inspect.signature(BeerGame.reset).parameters.items()
+        if parameter.default is not inspect.Parameter.empty
+    }
+
+
+def seed_everything(seed: int) -> None:
+    """Seed both random number generators used by the sim."""
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def episode_config(
+    config: Mapping[str, Any], policy: str | None = None
+) -> dict[str, Any]:
+    """Return the reset config for an episode, with policy as the agent type of the first agent."""
+    config = dict(config)
+    if policy is not None:
+        agent_types = list(config.get("agent_types", reset_defaults()["agent_types"]))
+        agent_types[0] = policy
+        config["agent_types"] = agent_types
+    return config
+
+
+def run_episode(
+    config: Mapping[str, Any],
+    seed: int,
+    iterations: int = 100,
+    policy: str | None = None,
+    action: int = 0,
+) -> float:
+    """Run a seeded episode and return the cumulative costs.
+
+    Unless the config sets a seed, the seed of the episode is also used for the random streams of
+    the sim, so episodes with the same seed see the same demand and lead times for every policy.
+
+    Args:
+        config: the BeerGame.reset config.
+        seed: the seed for the episode.
+        iterations: the number of steps.
+        policy: the agent type of the first agent, if None the config is used as is.
+        action: the order used for Bonsai agents.
+    """
+    beergame = BeerGame()
+    seed_everything(seed)
+    beergame.reset(**{"seed": seed, **episode_config(config, policy)})
+    for _ in beergame.rollout(
+        lambda _: action, horizon=iterations, chunk=max(1, iterations)
+    ):
+        pass
+    return float(sum(agent.total_costs for agent in beergame.agents))
+
+
+def half_width(stats: RunningStats, confidence: float = 0.95) -> float:
+    """Return the half width of the confidence interval of the mean."""
+    if stats.count < 2:
+        return math.inf
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    return z * math.sqrt(stats.sample_variance / stats.count)
+
+
+def compare_policies(
+    config: Mapping[str, Any],
+    policies: list[str],
+    iterations: int = 100,
+    antithetic: bool = False,
+    target_half_width: float | None = None,
+    confidence: float = 0.95,
+    min_pairs: int = 10,
+    max_pairs: int = 1000,
+    seed: int = 0,
+    action: int = 0,
+) -> dict[str, Any]:
+    """Compare policies on common random numbers, against the first policy.
+
+    Every policy is run on the same seeds, so it sees the same demand and lead times,
+    and the confidence intervals are computed on the paired differences with the first policy.
+    With antithetic, each observation is the mean of an episode and its antithetic counterpart.
+    Runs until the half width of every difference is below target_half_width (after min_pairs),
+    or until max_pairs.
+
+    Args:
+        config: the BeerGame.reset config.
+        policies: the agent types used for the first agent, the first one is the baseline.
+        iterations: the number of steps per episode.
+        antithetic: use antithetic pairs of episodes.
+        target_half_width: the half width of the confidence interval to stop at, None runs max_pairs.
+        confidence: the confidence level of the intervals.
+        min_pairs: the minimum number of observations.
+        max_pairs: the maximum number of observations.
+        seed: the first seed.
+        action: the order used for Bonsai agents.
+    """
+
+    def observe(policy: str, observation_seed: int) -> float:
+        costs = run_episode(config, observation_seed, iterations, policy, action)
+        if not antithetic:
+            return costs
+        mirrored = run_episode(
+            {**config, "antithetic": True}, observation_seed, iterations, policy, action
+        )
+        return (costs + mirrored) / 2
+
+    costs = [RunningStats() for _ in policies]
+    differences = [RunningStats() for _ in policies[1:]]
+    for observation_seed in range(seed, seed + max_pairs):
+        observed = [observe(policy, observation_seed) for policy in policies]
+        for stats, value in zip(costs, observed):
+            stats.update(value)
+        for stats, value in zip(differences, observed[1:]):
+            stats.update(value - observed[0])
+        if (
+            target_half_width is not None
+            and costs[0].count >= min_pairs
+            and all(half_width(d, confidence) <= target_half_width for d in differences)
+        ):
+            break
+    _LOGGER.info("Compared %s policies on %s seeds", len(policies), costs[0].count)
+    return {
+        "observations": costs[0].count,
+        "episodes_per_observation": 2 if antithetic else 1,
+        "confidence": confidence,
+        "policies": [
+            {
+                "policy": policy,
+                "mean": stats.mean,
+                "half_width": half_width(stats, confidence),
+            }
+            for policy, stats in zip(policies, costs)
+        ],
+        "differences": [
+            {
+                "policy": policy,
+                "baseline": policies[0],
+                "mean": stats.mean,
+                "half_width": half_width(stats, confidence),
+                "interval": [
+                    stats.mean - half_width(stats, confidence),
+                    stats.mean + half_width(stats, confidence),
+                ],
+            }
+            for policy, stats in zip(policies[1:], differences)
+        ],
+    }
@@ -0,0 +1,131 @@
+"""Event-driven engine that jumps over idle periods of a BeerGame."""
+from __future__ import annotations
+
+import heapq
+import logging
+import math
+
+from .beer_game import BeerGame
+from .const import DEMAND_DISTRIBUTION_PATTERN
+
+_LOGGER = logging.getLogger(__name__)
+
+# random demand is drawn ahead for the periods to skip, so skip in bounded jumps
+MAX_SKIP = 4096
+
+
+class EventDrivenEngine(object):
+    """Run a BeerGame from arrival to arrival, with the same results as stepping every period.
+
+    Shipment and order arrivals are kept in a priority queue. When the chain has settled into an
+    idle state (nothing arrived, was ordered or delivered during the whole history window) and every
+    agent decides on its state only, the periods up to the next arrival or non-zero demand are
+    skipped and their costs added in closed form. Otherwise the engine falls back to BeerGame.step.
+    A skip takes constant time, except for drawing random demand ahead, so the run time grows with
+    the number of events. Only the cost quantiles of the KPIs are estimated differently.
+
+    Skipping needs a seeded sim (or a scenario), so the demand can be drawn ahead and the lead time
+    draws of the skipped periods can be skipped per stream. Halting on costs is checked every step,
+    so it disables skipping.
+    """
+
+    def __init__(self, sim: BeerGame):
+        """Create the engine for a reset sim."""
+        self.sim = sim
+        self.steps = 0
+        self.skipped = 0
+        sim.event_queue = [
+            time
+            for agent in sim.agents
+            for history in (agent.arriving_shipments, agent.arriving_orders)
+            for time, amount in history.items()
+            if amount and time > sim.time
+        ]
+        heapq.heapify(sim.event_queue)
+
+    @property
+    def can_skip(self) -> bool:
+        """Return True if the configuration of the sim allows skipping."""
+        sim = self.sim
+        return (
+            sim.demand_stream is not None
+            and all(agent.decides_on_state for agent in sim.agents)
+            and not (sim.halting_rules.cost_factor and sim.halting_rules.cost_baseline)
+        )
+
+    def next_event(self) -> float:
+        """Return the time of the next arrival, inf if nothing is on the way."""
+        queue = self.sim.event_queue
+        assert queue is not None
+        while queue and queue[0] <= self.sim.time:
+            heapq.heappop(queue)
+        return queue[0] if queue else math.inf
+
+    def is_settled(self, action: int) -> bool:
+        """Return True if the next step would not change the state of any agent."""
+        sim = self.sim
+        for agent in sim.agents:
+            if (
+                agent.last_demand
+                or agent.last_order
+                or agent.last_delivered
+                or agent.last_received
+                or any(agent.recent_demand)
+                or any(agent.recent_orders)
+                or any(agent.recent_shipments)
+                or any(
+                    pipeline != agent.shipments_in_transit
+                    for pipeline in agent.recent_pipeline
+                )
+                or agent.decide_order(sim.time, action)
+            ):
+                return False
+        return True
+
+    def idle_periods(self, limit: int, action: int) -> int:
+        """Return how many of the next steps (at most limit) are idle and can be skipped."""
+        if not self.is_settled(action):
+            return 0
+        sim = self.sim
+        # the step from time t receives the arrivals at t + 1
+        limit = int(min(limit, self.next_event() - sim.time - 1))
+        if sim.demand_distribution == DEMAND_DISTRIBUTION_PATTERN:
+            return self.pattern_idle_periods(limit)
+        limit = min(limit, MAX_SKIP)
+        idle = 0
+        while idle < limit and sim.peek_demand(idle + 1)[idle] == 0:
+            idle += 1
+        return idle
+
+    def pattern_idle_periods(self, limit: int) -> int:
+        """Return how many of the next steps (at most limit) have a pattern demand of 0, without drawing."""
+        sim = self.sim
+        initial = max(0, sim.demand_pattern_step_time - sim.time)
+        if initial and sim.demand_low:
+            return 0
+        if sim.demand_high:
+            return min(initial, limit)
+        return limit
+
+    def skip(self, periods: int) -> None:
+        """Skip idle periods."""
+        sim = self.sim
+        sim.time += periods
+        for _ in range(min(periods, len(sim.demand_lookahead))):
+            sim.demand_lookahead.popleft()
+        for agent in sim.agents:
+            agent.skip_idle(periods)
+        sim.kpis.update_repeated(sim.agents, periods)
+        self.skipped += periods
+
+    def run(self, horizon: int, action: int = 0) -> None:
+        """Advance the sim by horizon periods, with a constant action for Bonsai agents."""
+        end = self.sim.time + horizon
+        can_skip = self.can_skip
+        while self.sim.time < end:
+            if can_skip and (idle := self.idle_periods(end - self.sim.time, action)):
+                self.skip(idle)
+                continue
+            self.sim.step(action)
+            self.steps += 1
+        _LOGGER.debug("Stepped %s periods, skipped %s", self.steps, self.skipped)
@@ -0,0 +1,73 @@
+"""Rules to halt runaway episodes early."""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from .const import (
+    HALT_REASON_BACKLOG,
+    HALT_REASON_COSTS,
+    HALT_REASON_INVENTORY,
+    HALT_REASON_NONE,
+    HALT_REASON_ORDERS,
+    HISTORY_WINDOW,
+)
+
+if TYPE_CHECKING:
+    from .beer_game import BeerGame
+
+
+class HaltingRules(object):
+    """Halting criteria checked after every step, a value of 0 disables a criterion."""
+
+    def __init__(
+        self,
+        backlog: float = 0,
+        inventory: float = 0,
+        cost_baseline: float = 0,
+        cost_factor: float = 0,
+        order_factor: float = 0,
+    ):
+        """Initialize the rules.
+
+        Args:
+            backlog: halt when the backlog of any agent exceeds this.
+            inventory: halt when the inventory of any agent exceeds this.
+            cost_baseline: the expected costs per step of a reference policy.
+            cost_factor: halt when the cumulative costs exceed cost_factor times the baseline costs so far.
+            order_factor: halt when any agent ordered more than order_factor times its demand over the history window.
+        """
+        self.backlog = backlog
+        self.inventory = inventory
+        self.cost_baseline = cost_baseline
+        self.cost_factor = cost_factor
+        self.order_factor = order_factor
+
+    def check(self, sim: BeerGame) -> int:
+        """Return the reason to halt, HALT_REASON_NONE if the episode can continue."""
+        agents = sim.agents
+        if self.backlog and any(
+            agent.customer_orders_to_be_filled > self.backlog for agent in agents
+        ):
+            return HALT_REASON_BACKLOG
+        if self.inventory and any(
+            agent.inventory_level > self.inventory for agent in agents
+        ):
+            return HALT_REASON_INVENTORY
+        if (
+            self.cost_factor
+            and self.cost_baseline
+            and sum(agent.total_costs for agent in agents)
+            > self.cost_factor * self.cost_baseline * sim.time
+        ):
+            return HALT_REASON_COSTS
+        if (
+            self.order_factor
+            and sim.time >= HISTORY_WINDOW
+            and any(
+                sum(agent.recent_orders)
+                > self.order_factor * max(1, sum(agent.recent_demand))
+                for agent in agents
+            )
+        ):
+            return HALT_REASON_ORDERS
+        return HALT_REASON_NONE
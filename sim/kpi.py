@@ -0,0 +1,319 @@
+"""Incremental supply chain KPIs, kept with constant memory per agent."""
+from __future__ import annotations
+
+import math
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .beer_game_agent import BeerGameAgent
+
+
+class RunningStats(object):
+    """Running count, mean and variance using Welford's algorithm."""
+
+    def __init__(self):
+        """Initialize empty stats."""
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, value: float) -> None:
+        """Add a value."""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def update_repeated(self, value: float, count: int) -> None:
+        """Add the same value count times."""
+        if count <= 0:
+            return
+        repeated = RunningStats()
+        repeated.count = count
+        repeated.mean = value
+        repeated.min = repeated.max = value
+        self.merge(repeated)
+
+    def merge(self, other: RunningStats) -> None:
+        """Merge the stats of another (disjoint) set of values into these (Chan et al.)."""
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def to_dict(self) -> dict[str, float]:
+        """Return a compact, serializable form of the stats."""
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self._m2,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, float]) -> RunningStats:
+        """Create stats from the output of to_dict."""
+        stats = cls()
+        stats.count = int(data["count"])
+        stats.mean = data["mean"]
+        stats._m2 = data["m2"]
+        stats.min = data["min"]
+        stats.max = data["max"]
+        return stats
+
+    @property
+    def variance(self) -> float:
+        """Return the population variance."""
+        return self._m2 / self.count if self.count else 0.0
+
+    @property
+    def sample_variance(self) -> float:
+        """Return the sample variance."""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        """Return the population standard deviation."""
+        return math.sqrt(self.variance)
+
+
+class P2Quantile(object):
+    """Streaming quantile estimate using the P-square algorithm (Jain & Chlamtac)."""
+
+    def __init__(self, p: float):
+        """Initialize the sketch for quantile p (between 0 and 1)."""
+        self.p = p
+        self._heights: list[float] = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def update(self, value: float) -> None:
+        """Add a value."""
+        if len(self._heights) < 5:
+            self._heights.append(value)
+            self._heights.sort()
+            return
+        k = self._cell(value)
+        for i in range(k + 1, 5):
+            self._positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+        for i in range(1, 4):
+            self._adjust(i)
+
+    def update_repeated(self, value: float, count: int) -> None:
+        """Add the same value count times, in constant time.
+
+        The markers are read as a piecewise linear distribution, a point mass of count at value
+        is added and the inner markers are set to their desired positions in the result.
+        """
+        while count > 0 and len(self._heights) < 5:
+            self.update(value)
+            count -= 1
+        if count <= 0:
+            return
+        heights, positions = list(self._heights), list(self._positions)
+        k = self._cell(value)
+        if value < heights[0]:
+            below = 0.0
+        elif value >= heights[4]:
+            below = float(positions[4])
+        else:
+            below = positions[k] + (value - heights[k]) / (
+                heights[k + 1] - heights[k]
+            ) * (positions[k + 1] - positions[k])
+        for i in range(5):
+            self._desired[i] += count * self._increments[i]
+        total = positions[4] + count
+        self._positions[4] = total
+        for i in range(1, 4):
+            position = min(
+                max(round(self._desired[i]), self._positions[i - 1] + 1),
+                total - 4 + i,
+            )
+            self._positions[i] = position
+            if below < position <= below + count:
+                self._heights[i] = value
+            else:
+                rank = position if position <= below else position - count
+                self._heights[i] = self._interpolate(heights, positions, rank)
+
+    @staticmethod
+    def _interpolate(heights: list[float], positions: list[int], rank: float) -> float:
+        """Return the height at rank, linear between the markers."""
+        for i in range(4):
+            if rank <= positions[i + 1]:
+                fraction = (rank - positions[i]) / (positions[i + 1] - positions[i])
+                return heights[i] + max(fraction, 0.0) * (heights[i + 1] - heights[i])
+        return heights[4]
+
+    def _cell(self, value: float) -> int:
+        """Return the cell k of a value (between markers k and k + 1), extending the extremes."""
+        heights = self._heights
+        if value < heights[0]:
+            heights[0] = value
+            return 0
+        if value >= heights[4]:
+            heights[4] = value
+            return 3
+        return next(i for i in range(4) if heights[i] <= value < heights[i + 1])
+
+    def _adjust(self, i: int) -> None:
+        """Move marker i towards its desired position."""
+        heights, positions = self._heights, self._positions
+        delta = self._desired[i] - positions[i]
+        if not (
+            (delta >= 1 and positions[i + 1] - positions[i] > 1)
+            or (delta <= -1 and positions[i - 1] - positions[i] < -1)
+        ):
+            return
+        d = 1 if delta > 0 else -1
+        parabolic = heights[i] + d / (positions[i + 1] - positions[i - 1]) * (
+            (positions[i] - positions[i - 1] + d)
+            * (heights[i + 1] - heights[i])
+            / (positions[i + 1] - positions[i])
+            + (positions[i + 1] - positions[i] - d)
+            * (heights[i] - heights[i - 1])
+            / (positions[i] - positions[i - 1])
+        )
+        if heights[i - 1] < parabolic < heights[i + 1]:
+            heights[i] = parabolic
+        else:
+            heights[i] += (
+                d * (heights[i + d] - heights[i]) / (positions[i + d] - positions[i])
+            )
+        positions[i] += d
+
+    @property
+    def value(self) -> float:
+        """Return the current estimate of the quantile."""
+        heights = self._heights
+        if not heights:
+            return 0.0
+        if len(heights) < 5:
+            return heights[min(len(heights) - 1, int(self.p * len(heights)))]
+        return heights[2]
+
+
+class AgentKPIs(object):
+    """KPIs for a single agent."""
+
+    def __init__(self):
+        """Initialize the KPIs."""
+        self.demand = RunningStats()
+        self.orders = RunningStats()
+        self.inventory = RunningStats()
+        self.backlog = RunningStats()
+        self.costs = RunningStats()
+        self.costs_p50 = P2Quantile(0.5)
+        self.costs_p95 = P2Quantile(0.95)
+        self.total_demand = 0
+        self.filled_immediately = 0
+
+    def update(self, agent: BeerGameAgent) -> None:
+        """Update with the state of the agent at the end of a step."""
+        self.demand.update(agent.last_demand)
+        self.orders.update(agent.last_order)
+        self.inventory.update(agent.inventory_level)
+        self.backlog.update(agent.customer_orders_to_be_filled)
+        self.costs.update(agent.current_costs)
+        self.costs_p50.update(agent.current_costs)
+        self.costs_p95.update(agent.current_costs)
+        # backlog is served first, so only what is delivered beyond it fills new demand
+        old_backlog = (
+            agent.customer_orders_to_be_filled
+            + agent.last_delivered
+            - agent.last_demand
+        )
+        self.total_demand += agent.last_demand
+        self.filled_immediately += min(
+            agent.last_demand, max(0, agent.last_delivered - old_backlog)
+        )
+
+    def update_repeated(self, agent: BeerGameAgent, count: int) -> None:
+        """Update with count steps in which the state of the agent did not change."""
+        costs = agent.state_costs
+        self.demand.update_repeated(agent.last_demand, count)
+        self.orders.update_repeated(agent.last_order, count)
+        self.inventory.update_repeated(agent.inventory_level, count)
+        self.backlog.update_repeated(agent.customer_orders_to_be_filled, count)
+        self.costs.update_repeated(costs, count)
+        self.costs_p50.update_repeated(costs, count)
+        self.costs_p95.update_repeated(costs, count)
+        self.total_demand += count * agent.last_demand
+
+    @property
+    def bullwhip(self) -> float:
+        """Return the variance of the orders placed over the variance of the demand received."""
+        if not self.demand.variance:
+            return 0.0
+        return self.orders.variance / self.demand.variance
+
+    @property
+    def fill_rate(self) -> float:
+        """Return the fraction of the demand that was delivered in the period it arrived."""
+        if not self.total_demand:
+            return 1.0
+        return self.filled_immediately / self.total_demand
+
+    @property
+    def report(self) -> dict[str, float]:
+        """Return a summary of the KPIs."""
+        return {
+            "bullwhip": self.bullwhip,
+            "fill_rate": self.fill_rate,
+            "demand_mean": self.demand.mean,
+            "demand_variance": self.demand.variance,
+            "orders_mean": self.orders.mean,
+            "orders_variance": self.orders.variance,
+            "inventory_mean": self.inventory.mean,
+            "inventory_variance": self.inventory.variance,
+            "backlog_mean": self.backlog.mean,
+            "backlog_max": self.backlog.max if self.backlog.count else 0,
+            "costs_mean": self.costs.mean,
+            "costs_p50": self.costs_p50.value,
+            "costs_p95": self.costs_p95.value,
+        }
+
+
+class SupplyChainKPIs(object):
+    """KPIs for all agents in the chain."""
+
+    def __init__(self, num_agents: int):
+        """Initialize the KPIs for each agent."""
+        self.agents = [AgentKPIs() for _ in range(num_agents)]
+
+    def update(self, agents: list[BeerGameAgent]) -> None:
+        """Update with the agents at the end of a step."""
+        for kpis, agent in zip(self.agents, agents):
+            kpis.update(agent)
+
+    def update_repeated(self, agents: list[BeerGameAgent], count: int) -> None:
+        """Update with count steps in which the state of the agents did not change."""
+        for kpis, agent in zip(self.agents, agents):
+            kpis.update_repeated(agent, count)
+
+    @property
+    def state(self) -> dict[str, list[float]]:
+        """Return the KPIs that are part of the sim state."""
+        return {
+            "bullwhip": [a.bullwhip for a in self.agents],
+            "fill_rates": [a.fill_rate for a in self.agents],
+            "inventory_variances": [a.inventory.variance for a in self.agents],
+        }
+
+    @property
+    def report(self) -> list[dict[str, Any]]:
+        """Return a summary per agent."""
+        return [a.report for a in self.agents]
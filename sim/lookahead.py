@@ -0,0 +1,371 @@
+"""Monte-Carlo lookahead planning of orders with batched rollouts of the chain.
+
+A decision copies the state of the chain into arrays with one row per (candidate order, rollout)
+and simulates the next steps for all rows at once. The planning agent places the candidate now and
+then replaces what it receives from its customer, the other agents follow their own rules. The
+candidate with the lowest mean costs of the chain over the horizon is ordered. All candidates see
+the same demand and lead time draws (common random numbers), so their differences are sharp.
+
+Rounds of rollouts are added until the time budget is used up, optionally spread over a pool of
+processes that each run rounds within the budget.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+from .const import (
+    AGENT_TYPE_BASESTOCK,
+    AGENT_TYPE_DP,
+    AGENT_TYPE_LOOKAHEAD,
+    AGENT_TYPE_RANDOM,
+    AGENT_TYPE_STRM,
+    DEMAND_DISTRIBUTION_NORMAL,
+    DEMAND_DISTRIBUTION_PATTERN,
+    HISTORY_WINDOW,
+)
+
+if TYPE_CHECKING:
+    from .beer_game import BeerGame
+
+_LOGGER = logging.getLogger(__name__)
+
+_POOLS: dict[int, ProcessPoolExecutor] = {}
+
+
+def snapshot(sim: BeerGame, agent_num: int, horizon: int) -> dict[str, Any]:
+    """Return the state of the chain while agent_num decides, as plain arrays.
+
+    The agents before agent_num have already placed their orders of this step.
+    """
+    time_now = sim.time
+    agents = sim.agents
+    times = np.arange(time_now + 1, time_now + horizon + 1)
+    window = np.arange(time_now - HISTORY_WINDOW, time_now + 1)
+    return {
+        "time": time_now,
+        "agent_num": agent_num,
+        "horizon": horizon,
+        "max_action": sim.max_action,
+        "demand": (
+            sim.demand_distribution,
+            sim.demand_low,
+            sim.demand_high,
+            sim.demand_mu,
+            sim.demand_sigma,
+            sim.demand_pattern_step_time,
+        ),
+        "types": [agent.agent_type for agent in agents],
+        "costs_holding": np.array([agent.c_h for agent in agents], dtype=float),
+        "costs_shortage": np.array([agent.c_p for agent in agents], dtype=float),
+        "leadtime_orders": np.array([agent.leadtime_orders for agent in agents]),
+        "leadtime_receiving": np.array([agent.leadtime_receiving for agent in agents]),
+        "strm": np.array(
+            [
+                (
+                    getattr(agent, "alpha_b", 0.0),
+                    getattr(agent, "beta_b", 0.0),
+                    agent.a_b,
+                    agent.b_b,
+                )
+                for agent in agents
+            ]
+        ),
+        "basestock": np.array([getattr(agent, "basestock", 0) for agent in agents]),
+        "dp": [
+            (agent.policy.lower, agent.policy.orders)
+            if hasattr(agent, "policy")
+            else None
+            for agent in agents
+        ],
+        "inventory": np.array([agent.inventory_level for agent in agents]),
+        "backlog": np.array([agent.customer_orders_to_be_filled for agent in agents]),
+        "on_order": np.array(
+            [agent.supplier_orders_to_be_delivered for agent in agents]
+        ),
+        "received": np.array([agent.last_received for agent in agents]),
+        "last_demand": np.array([agent.last_demand for agent in agents]),
+        "last_order": np.array([agent.last_order for agent in agents]),
+        "shipments": np.array(
+            [
+                [agent.arriving_shipments.get(key, 0) for key in times]
+                for agent in agents
+            ]
+        ),
+        "orders": np.array(
+            [[agent.arriving_orders.get(key, 0) for key in times] for agent in agents]
+        ),
+        "orders_present": np.array(
+            [[key in agent.arriving_orders for key in times] for agent in agents]
+        ),
+        "arrived_window": np.array(
+            [[agent.arriving_orders.get(key, 0) for key in window] for agent in agents]
+        ),
+        "arrived_present": np.array(
+            [[key in agent.arriving_orders for key in window] for agent in agents]
+        ),
+        "orders_window": np.array(
+            [
+                [agent.previous_orders.get(key, 0) for key in window[:-1]]
+                for agent in agents
+            ]
+        ),
+    }
+
+
+def _draw_demand(
+    state: dict[str, Any], time_now: int, rng: np.random.Generator, size: int
+) -> np.ndarray:
+    """Draw the customer demand of a step, the same way as BeerGame.draw_demand."""
+    distribution, low, high, mu, sigma, step_time = state["demand"]
+    if distribution == DEMAND_DISTRIBUTION_NORMAL:
+        return rng.normal(mu, sigma, size).astype(np.int64)
+    if distribution == DEMAND_DISTRIBUTION_PATTERN:
+        return np.full(size, low if time_now < step_time else high)
+    return rng.integers(low, high + 1, size)
+
+
+def rollout_costs(
+    state: dict[str, Any],
+    candidates: np.ndarray,
+    rollouts: int,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """Simulate rollouts for every candidate at once, returns the costs of the chain with shape (candidates, rollouts)."""
+    num_candidates = len(candidates)
+    size = num_candidates * rollouts
+    rows = np.arange(size)
+    horizon = state["horizon"]
+    agent_num = state["agent_num"]
+    types = state["types"]
+    num_agents = len(types)
+    start = state["time"]
+
+    def common(draws: np.ndarray) -> np.ndarray:
+        """Repeat the draws of the rollouts for every candidate."""
+        return np.tile(draws, num_candidates)
+
+    def batch(values: np.ndarray) -> np.ndarray:
+        """Repeat the values for every row."""
+        return np.repeat(values[None], size, axis=0).astype(np.int64)
+
+    inventory = batch(state["inventory"])
+    backlog = batch(state["backlog"])
+    on_order = batch(state["on_order"])
+    received = batch(state["received"])
+    last_demand = batch(state["last_demand"])
+    last_order = batch(state["last_order"])
+    shipments = batch(state["shipments"])
+    orders = batch(state["orders"])
+    orders_present = np.repeat(state["orders_present"][None], size, axis=0)
+    arrived_window = batch(state["arrived_window"])
+    arrived_present = np.repeat(state["arrived_present"][None], size, axis=0)
+    orders_window = batch(state["orders_window"])
+    costs = np.zeros(size)
+    holding, shortage = state["costs_holding"], state["costs_shortage"]
+    leadtime_orders, leadtime_receiving = (
+        state["leadtime_orders"],
+        state["leadtime_receiving"],
+    )
+
+    def schedule(
+        pipeline: np.ndarray, num: int, now: int, leadtime: tuple[int, int], amount: Any
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Add amount to the pipeline of agent num, arriving after a drawn lead time.
+
+        Returns the rows and indices of the arrivals within the horizon.
+        """
+        arrival = now + common(rng.integers(leadtime[0], leadtime[1] + 1, rollouts)) + 1
+        index = arrival - start - 1
+        inside = index < horizon
+        pipeline[rows[inside], num, index[inside]] += np.broadcast_to(amount, size)[
+            inside
+        ]
+        return rows[inside], index[inside]
+
+    def decide(num: int) -> np.ndarray:
+        """Return the orders of agent num following its rule."""
+        agent_type = types[num]
+        if agent_type == AGENT_TYPE_STRM:
+            alpha, beta, a_b, b_b = state["strm"][num]
+            return np.maximum(
+                0,
+                np.round(
+                    received[:, num]
+                    + alpha * (inventory[:, num] - a_b)
+                    + beta * (backlog[:, num] - b_b)
+                ),
+            ).astype(np.int64)
+        if agent_type == AGENT_TYPE_BASESTOCK:
+            count = arrived_present[:, num].sum(axis=1)
+            total = (arrived_window[:, num] * arrived_present[:, num]).sum(axis=1)
+            supplier_backlog = backlog[:, num + 1] if num < num_agents - 1 else 0
+            return np.maximum(
+                0,
+                np.round(
+                    state["basestock"][num]
+                    + 4 * np.where(count > 0, total / np.maximum(count, 1), 0)
+                    + backlog[:, num]
+                    - supplier_backlog
+                    - orders_window[:, num].sum(axis=1)
+                ),
+            ).astype(np.int64)
+        if agent_type == AGENT_TYPE_DP:
+            lower, table = state["dp"][num]
+            index = inventory[:, num] - backlog[:, num] + on_order[:, num] - lower
+            return np.where(
+                index < 0,
+                table[0] - index,
+                table[np.clip(index, 0, len(table) - 1)],
+            )
+        if agent_type == AGENT_TYPE_RANDOM:
+            return common(rng.integers(0, 4, rollouts))
+        if agent_type == AGENT_TYPE_LOOKAHEAD:
+            # replace what the customer ordered
+            return last_demand[:, num].copy()
+        # bonsai and manual agents keep their last order
+        return last_order[:, num].copy()
+
+    for now in range(start, start + horizon):
+        if now > start:
+            demand = common(_draw_demand(state, now, rng, rollouts))
+            marked_rows, marked = schedule(orders, 0, now, leadtime_orders[0], demand)
+            orders_present[marked_rows, 0, marked] = True
+        for num in range(num_agents):
+            if now == start and num < agent_num:
+                # already ordered this step
+                order = last_order[:, num]
+            else:
+                if now == start and num == agent_num:
+                    order = np.repeat(candidates, rollouts)
+                else:
+                    order = decide(num)
+                order = np.minimum(order, state["max_action"])
+                on_order[:, num] += order
+                if num < num_agents - 1:
+                    marked_rows, marked = schedule(
+                        orders, num + 1, now, leadtime_orders[num + 1], order
+                    )
+                    orders_present[marked_rows, num + 1, marked] = True
+                else:
+                    schedule(shipments, num, now, leadtime_receiving[num], order)
+            last_order[:, num] = order
+            orders_window[:, num] = np.roll(orders_window[:, num], -1, axis=1)
+            orders_window[:, num, -1] = order
+        index = now - start
+        received[:] = shipments[:, :, index]
+        inventory += received
+        on_order -= received
+        last_demand[:] = orders[:, :, index]
+        backlog += last_demand
+        arrived_window[:] = np.roll(arrived_window, -1, axis=2)
+        arrived_window[:, :, -1] = last_demand
+        arrived_present[:] = np.roll(arrived_present, -1, axis=2)
+        arrived_present[:, :, -1] = orders_present[:, :, index]
+        delivered = np.minimum(inventory, backlog)
+        inventory -= delivered
+        backlog -= delivered
+        for num in range(1, num_agents):
+            schedule(
+                shipments,
+                num - 1,
+                now + 1,
+                leadtime_receiving[num - 1],
+                delivered[:, num],
+            )
+        costs += (
+            shortage * np.maximum(0, backlog) + holding * np.maximum(0, inventory)
+        ).sum(axis=1)
+    return costs.reshape(num_candidates, rollouts)
+
+
+def evaluate(
+    state: dict[str, Any],
+    candidates: np.ndarray,
+    rollouts: int,
+    budget: float,
+    seed: Any,
+) -> tuple[np.ndarray, int]:
+    """Run rounds of at most rollouts rollouts per candidate within the time budget.
+
+    The first round runs one rollout per candidate. Each following round is sized so that the
+    time of the previous round, scaled up by the growth of the round, fits in the rest of the
+    budget; the steps of the horizon take the same time for any size, so this is an upper bound.
+    The first round always runs, so a budget below its time is exceeded by it.
+    A budget of 0 runs one round of rollouts.
+    Returns the summed costs per candidate and the number of rollouts per candidate.
+    """
+    rng = np.random.default_rng(seed)
+    if budget <= 0:
+        return rollout_costs(state, candidates, rollouts, rng).sum(axis=1), rollouts
+    started = time.perf_counter()
+    sums = np.zeros(len(candidates))
+    count = 0
+    size = 1
+    while size >= 1:
+        round_started = time.perf_counter()
+        sums += rollout_costs(state, candidates, size, rng).sum(axis=1)
+        count += size
+        now = time.perf_counter()
+        left = budget - (now - started)
+        if now - round_started > left:
+            break
+        size = min(rollouts, int(size * left / (now - round_started)))
+    return sums, count
+
+
+def _pool(processes: int) -> ProcessPoolExecutor:
+    """Return the shared pool with processes workers."""
+    if processes not in _POOLS:
+        _POOLS[processes] = ProcessPoolExecutor(processes)
+    return _POOLS[processes]
+
+
+def plan_order(sim: BeerGame, agent_num: int) -> int:
+    """Return the candidate order with the lowest expected costs of the chain for agent_num.
+
+    Uses sim.lookahead_horizon, lookahead_rollouts (per round), lookahead_budget (seconds per
+    decision, 0 runs one round) and lookahead_processes (0 runs in this process).
+    With a seeded sim the rollouts are seeded by the seed, the agent and the time.
+    """
+    state = snapshot(sim, agent_num, sim.lookahead_horizon)
+    candidates = np.arange(sim.max_action + 1)
+    seed = (
+        (sim.seed, agent_num, sim.time)
+        if sim.seed is not None and sim.seed >= 0
+        else int(np.random.randint(2**31))
+    )
+    if sim.lookahead_processes > 0:
+        seeds = np.random.SeedSequence(seed).spawn(sim.lookahead_processes)
+        pool = _pool(sim.lookahead_processes)
+        futures = [
+            pool.submit(
+                evaluate,
+                state,
+                candidates,
+                sim.lookahead_rollouts,
+                sim.lookahead_budget,
+                process_seed,
+            )
+            for process_seed in seeds
+        ]
+        results = [future.result() for future in futures]
+        sums = sum(result[0] for result in results)
+        count = sum(result[1] for result in results)
+    else:
+        sums, count = evaluate(
+            state,
+            candidates,
+            sim.lookahead_rollouts,
+            sim.lookahead_budget,
+            seed,
+        )
+    order = int(candidates[np.argmin(sums)])
+    _LOGGER.debug(
+        "Agent %s orders %s after %s rollouts per candidate", agent_num, order, count
+    )
+    return order
@@ -0,0 +1,164 @@
+"""Batched inference of learned ordering policies over many sims."""
+from __future__ import annotations
+
+import logging
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from .beer_game import BeerGame
+from .const import AGENT_TYPE_BONSAI, OBSERVATION_FIELDS
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def observe(sim: BeerGame, agent_num: int, out: np.ndarray) -> None:
+    """Write the observation of an agent into out, the fields match ObservableState in teaching.ink."""
+    agent = sim.agents[agent_num]
+    out[0] = agent.inventory_level
+    out[1] = agent.customer_orders_to_be_filled
+    out[2] = agent.supplier_orders_to_be_delivered
+    out[3] = agent.shipments_in_transit
+    out[4] = agent.orders_in_transit
+    out[5] = agent.current_costs
+    out[6] = agent.total_costs
+    out[7] = sim.time
+
+
+class MLPPolicy(object):
+    """Multi-layer perceptron in NumPy, with ReLU hidden layers.
+
+    The weight file is an .npz with arrays W0, b0, W1, b1, ... and optionally mean and std
+    to normalize the observations. A single output is rounded to the order,
+    multiple outputs are scores for orders 0, 1, 2, ... and the highest one is used.
+    """
+
+    def __init__(self, weights: dict[str, np.ndarray]):
+        """Create the policy from the weights."""
+        self.layers: list[tuple[np.ndarray, np.ndarray]] = []
+        while f"W{len(self.layers)}" in weights:
+            num = len(self.layers)
+            self.layers.append(
+                (
+                    np.asarray(weights[f"W{num}"], dtype=np.float32),
+                    np.asarray(weights[f"b{num}"], dtype=np.float32),
+                )
+            )
+        if not self.layers:
+            raise ValueError("No layers (W0, b0) found in the weights.")
+        if self.layers[0][0].shape[0] != len(OBSERVATION_FIELDS):
+            raise ValueError(
+                f"The first layer expects {self.layers[0][0].shape[0]} inputs, "
+                f"observations have {len(OBSERVATION_FIELDS)}."
+            )
+        self.mean = np.asarray(weights.get("mean", 0), dtype=np.float32)
+        self.std = np.asarray(weights.get("std", 1), dtype=np.float32)
+
+    @classmethod
+    def load(cls, path: str | Path) -> MLPPolicy:
+        """Load the policy from an .npz file."""
+        with np.load(path) as weights:
+            return cls(dict(weights))
+
+    def forward(self, observations: np.ndarray) -> np.ndarray:
+        """Return the raw outputs for a batch of observations."""
+        hidden = (observations - self.mean) / self.std
+        for weights, bias in self.layers[:-1]:
+            hidden = np.maximum(hidden @ weights + bias, 0)
+        weights, bias = self.layers[-1]
+        return hidden @ weights + bias
+
+    def __call__(self, observations: np.ndarray) -> np.ndarray:
+        """Return the orders for a batch of observations."""
+        return outputs_to_orders(self.forward(observations))
+
+
+class OnnxPolicy(object):
+    """Policy exported to ONNX, run with ONNX Runtime on the CPU.
+
+    The model takes a float32 batch of observations and returns the outputs as MLPPolicy does.
+    """
+
+    def __init__(self, path: str | Path):
+        """Load the model, onnxruntime is only needed for this policy."""
+        try:
+            import onnxruntime  # pylint: disable=import-outside-toplevel
+        except ImportError as exc:
+            raise ImportError(
+                "onnxruntime is needed for ONNX policies: pip install onnxruntime"
+            ) from exc
+        self.session = onnxruntime.InferenceSession(
+            str(path), providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, observations: np.ndarray) -> np.ndarray:
+        """Return the orders for a batch of observations."""
+        (outputs,) = self.session.run(None, {self.input_name: observations})[:1]
+        return outputs_to_orders(np.asarray(outputs))
+
+
+def outputs_to_orders(outputs: np.ndarray) -> np.ndarray:
+    """Convert the outputs of a model to non-negative integer orders."""
+    if outputs.ndim == 1 or outputs.shape[1] == 1:
+        return np.maximum(np.rint(outputs.reshape(-1)), 0).astype(np.int64)
+    return np.argmax(outputs, axis=1)
+
+
+def load_policy(path: str | Path) -> MLPPolicy | OnnxPolicy:
+    """Load a policy, based on the extension of the file (.npz or .onnx)."""
+    if str(path).endswith(".onnx"):
+        return OnnxPolicy(path)
+    return MLPPolicy.load(path)
+
+
+class BatchedPolicyRunner(object):
+    """Step many sims with one batched forward pass of the policy per step.
+
+    The policy decides the orders of the agent at agent_num in every sim, which has to be a Bonsai
+    agent, the action of a step is ignored by the other agent types.
+    """
+
+    def __init__(
+        self,
+        policy: Any,
+        sims: Sequence[BeerGame],
+        agent_num: int = 0,
+    ):
+        """Create the runner for reset sims."""
+        for sim in sims:
+            if not 0 <= agent_num < sim.num_agents:
+                raise ValueError(
+                    f"Agent {agent_num} does not exist in a chain of {sim.num_agents}."
+                )
+            if sim.agents[agent_num].agent_type != AGENT_TYPE_BONSAI:
+                raise ValueError(
+                    f"Agent {agent_num} is a '{sim.agents[agent_num].agent_type}' agent, "
+                    f"the policy can only drive a '{AGENT_TYPE_BONSAI}' agent."
+                )
+        self.policy = policy
+        self.sims = list(sims)
+        self.agent_num = agent_num
+        self.observations = np.zeros(
+            (len(self.sims), len(OBSERVATION_FIELDS)), dtype=np.float32
+        )
+
+    def step(self) -> np.ndarray:
+        """Gather the observations, run the policy once and step every sim, returns the orders."""
+        for row, sim in enumerate(self.sims):
+            observe(sim, self.agent_num, self.observations[row])
+        orders = self.policy(self.observations)
+        for sim, order in zip(self.sims, orders):
+            sim.step(int(order))
+        return orders
+
+    def run(self, iterations: int) -> list[float]:
+        """Run iterations steps, returns the cumulative costs of each sim."""
+        for _ in range(iterations):
+            self.step()
+        _LOGGER.debug("Ran %s sims for %s steps", len(self.sims), iterations)
+        return [
+            float(sum(agent.total_costs for agent in sim.agents)) for sim in self.sims
+        ]
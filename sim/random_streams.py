@@ -0,0 +1,81 @@
+"""Independent random streams, used for common random numbers between policies."""
+from __future__ import annotations
+
+import hashlib
+from statistics import NormalDist
+
+import numpy as np
+
+_EPSILON = 1e-12
+# uniform draws generated at once, a python float from a list is cheaper than a call into numpy
+_BLOCK = 64
+
+
+class RandomStream(object):
+    """A stream of uniform draws, optionally antithetic (1 - u), transformed by inversion.
+
+    The draws come from a PCG64 generator, which can jump ahead, so skipping draws takes constant time.
+    """
+
+    def __init__(self, seed: int, name: str, antithetic: bool = False):
+        """Create the stream for seed and name, streams with different names are independent."""
+        digest = hashlib.sha256(f"{seed}:{name}".encode()).digest()
+        self._bit_generator = np.random.PCG64(int.from_bytes(digest, "little"))
+        self._generator = np.random.Generator(self._bit_generator)
+        self._block: list[float] = []
+        self._next = 0
+        self.antithetic = antithetic
+
+    def uniform(self) -> float:
+        """Return a uniform draw in [0, 1)."""
+        if self._next == len(self._block):
+            self._block = self._generator.random(_BLOCK).tolist()
+            self._next = 0
+        value = self._block[self._next]
+        self._next += 1
+        return 1 - value if self.antithetic else value
+
+    def skip(self, count: int) -> None:
+        """Skip count draws, each draw takes one step of the generator."""
+        buffered = len(self._block) - self._next
+        if count <= buffered:
+            self._next += count
+            return
+        self._bit_generator.advance(count - buffered)
+        self._block = []
+        self._next = 0
+
+    def randint(self, low: int, high: int) -> int:
+        """Return a random integer in [low, high], including both end points."""
+        return low + min(int(self.uniform() * (high - low + 1)), high - low)
+
+    def normal(self, mu: float, sigma: float) -> float:
+        """Return a draw from a normal distribution."""
+        if sigma <= 0:
+            return mu
+        probability = min(max(self.uniform(), _EPSILON), 1 - _EPSILON)
+        return NormalDist(mu, sigma).inv_cdf(probability)
+
+
+class ArrayStream(RandomStream):
+    """A stream that replays the uniform draws in an array, wrapping around at the end."""
+
+    def __init__(self, values: np.ndarray, antithetic: bool = False):
+        """Create the stream over values, the array is referenced, not copied."""
+        self._values = values
+        self._index = 0
+        self.antithetic = antithetic
+
+    def uniform(self) -> float:
+        """Return the next uniform draw from the array."""
+        value = float(self._values[self._index])
+        self._index = (self._index + 1) % len(self._values)
+        return 1 - value if self.antithetic else value
+
+    def skip(self, count: int) -> None:
+        """Skip count draws."""
+        self._index = (self._index + count) % len(self._values)
+
+    def detach(self) -> None:
+        """Replace the referenced array by a copy, releasing the buffer it is a view on."""
+        self._values = np.array(self._values)
@@ -0,0 +1,195 @@
+"""Bank of scenarios shared between processes without copying.
+
+A scenario holds the uniform draws behind the demand and the order and shipment lead times of
+every agent, and the initial inventory, arriving orders and arriving shipments. The bank lives in
+one block of shared memory or in a memory-mapped file, with this layout:
+
+    header: int64[4] (magic, count, horizon, num_agents)
+    demand: float64[count, horizon]
+    receiving: float64[count, num_agents, horizon]
+    orders: float64[count, num_agents, horizon]
+    inventory_initial, arriving_orders_initial, arriving_shipments_initial: int64[count, num_agents]
+
+Sim instances reference a scenario by index with BeerGame(scenario_bank=bank).reset(scenario=index).
+"""
+from __future__ import annotations
+
+import logging
+import weakref
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from .random_streams import ArrayStream
+
+_LOGGER = logging.getLogger(__name__)
+
+_MAGIC = 0x42454552  # "BEER"
+_HEADER_SIZE = 4 * 8
+INITIAL_STATE_FIELDS = (
+    "inventory_initial",
+    "arriving_orders_initial",
+    "arriving_shipments_initial",
+)
+
+
+def _layout(
+    count: int, horizon: int, num_agents: int
+) -> dict[str, tuple[type, tuple[int, ...]]]:
+    """Return the dtype and shape of each array, in order."""
+    return {
+        "demand": (np.float64, (count, horizon)),
+        "receiving": (np.float64, (count, num_agents, horizon)),
+        "orders": (np.float64, (count, num_agents, horizon)),
+        **{field: (np.int64, (count, num_agents)) for field in INITIAL_STATE_FIELDS},
+    }
+
+
+def _size(count: int, horizon: int, num_agents: int) -> int:
+    """Return the size of a bank in bytes."""
+    return _HEADER_SIZE + sum(
+        np.dtype(dtype).itemsize * int(np.prod(shape))
+        for dtype, shape in _layout(count, horizon, num_agents).values()
+    )
+
+
+class ScenarioBank(object):
+    """Scenarios stored in a shared buffer, the arrays are views on that buffer."""
+
+    def __init__(
+        self,
+        buffer: Any,
+        shm: shared_memory.SharedMemory | None = None,
+    ):
+        """Create the views on a buffer that holds a bank, use create, attach or load instead."""
+        self._shm = shm
+        header = np.frombuffer(buffer, dtype=np.int64, count=4)
+        if header[0] != _MAGIC:
+            raise ValueError("Buffer does not contain a scenario bank.")
+        self.count, self.horizon, self.num_agents = (int(value) for value in header[1:])
+        self._buffer = buffer
+        self._streams: weakref.WeakSet[ArrayStream] = weakref.WeakSet()
+        offset = _HEADER_SIZE
+        self.arrays: dict[str, np.ndarray] = {}
+        for field, (dtype, shape) in _layout(
+            self.count, self.horizon, self.num_agents
+        ).items():
+            size = int(np.prod(shape))
+            self.arrays[field] = np.frombuffer(
+                buffer, dtype=dtype, count=size, offset=offset
+            ).reshape(shape)
+            offset += np.dtype(dtype).itemsize * size
+
+    @classmethod
+    def create(
+        cls,
+        count: int,
+        horizon: int,
+        num_agents: int = 4,
+        seed: int = 0,
+        initial_high: int = 0,
+        name: str | None = None,
+    ) -> ScenarioBank:
+        """Generate a bank in a new block of shared memory.
+
+        Args:
+            count: the number of scenarios.
+            horizon: the number of draws per stream, streams wrap around after this.
+            num_agents: the number of agents.
+            seed: the seed used to generate the scenarios.
+            initial_high: the initial states are drawn uniformly from 0 to initial_high.
+            name: the name of the shared memory block, generated if None.
+        """
+        size = _size(count, horizon, num_agents)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        np.frombuffer(shm.buf, dtype=np.int64, count=4)[:] = (
+            _MAGIC,
+            count,
+            horizon,
+            num_agents,
+        )
+        bank = cls(shm.buf, shm)
+        rng = np.random.default_rng(seed)
+        for field, array in bank.arrays.items():
+            if field in INITIAL_STATE_FIELDS:
+                array[:] = rng.integers(
+                    0, initial_high, size=array.shape, endpoint=True
+                )
+            else:
+                array[:] = rng.random(size=array.shape)
+        _LOGGER.info("Created scenario bank %s of %s bytes", shm.name, size)
+        return bank
+
+    @classmethod
+    def attach(cls, name: str) -> ScenarioBank:
+        """Attach to a bank in shared memory created by another process."""
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)  # type: ignore[call-arg]
+        except TypeError:  # track is new in python 3.13
+            # Without track, the block is registered with the resource tracker of this process,
+            # which unlinks it when the process exits. Unregistering afterwards is not an option,
+            # a worker started by multiprocessing shares the tracker of the process that created
+            # the bank and would drop its registration, so the registration is skipped instead.
+            register = resource_tracker.register
+            resource_tracker.register = lambda name, rtype: None
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+        return cls(shm.buf, shm)
+
+    @classmethod
+    def load(cls, path: str | Path) -> ScenarioBank:
+        """Memory-map a bank saved with save, read only."""
+        return cls(np.memmap(path, dtype=np.uint8, mode="r"))
+
+    def save(self, path: str | Path) -> None:
+        """Save the bank to a file that can be memory-mapped with load."""
+        with open(path, "wb") as file:
+            file.write(memoryview(self._buffer).cast("B"))
+
+    @property
+    def name(self) -> str | None:
+        """Return the name of the shared memory block, None for a memory-mapped file."""
+        return self._shm.name if self._shm is not None else None
+
+    def close(self) -> None:
+        """Release the views and detach from the shared memory.
+
+        Streams handed out by the bank get a private copy of their draws, so sims that still use
+        them keep working. Other views on the arrays have to be released first.
+        """
+        for stream in list(self._streams):
+            stream.detach()
+        self.arrays = {}
+        self._buffer = None
+        if self._shm is not None:
+            self._shm.close()
+
+    def unlink(self) -> None:
+        """Free the shared memory, call this once from the process that created the bank."""
+        if self._shm is not None:
+            self._shm.unlink()
+
+    def __len__(self) -> int:
+        """Return the number of scenarios."""
+        return self.count
+
+    def stream(self, index: int, name: str, antithetic: bool = False) -> ArrayStream:
+        """Return the stream with name ("demand", "receiving_<agent>" or "orders_<agent>") of a scenario."""
+        if name == "demand":
+            stream = ArrayStream(self.arrays["demand"][index], antithetic)
+        else:
+            field, agent_num = name.rsplit("_", 1)
+            stream = ArrayStream(self.arrays[field][index, int(agent_num)], antithetic)
+        self._streams.add(stream)
+        return stream
+
+    def initial_state(self, index: int) -> dict[str, list[int]]:
+        """Return the initial state of a scenario as reset config values."""
+        return {
+            field: [int(value) for value in self.arrays[field][index]]
+            for field in INITIAL_STATE_FIELDS
+        }
@@ -0,0 +1,308 @@
+"""Surrogate model of the expected episode costs over a region of the reset config space."""
+from __future__ import annotations
+
+import json
+import logging
+import math
+from collections.abc import Callable, Mapping, Sequence
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from .evaluation import reset_defaults, run_episode
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class Dimension(object):
+    """A range of one or more reset config values that are varied together.
+
+    With index set only that entry of list values is varied, otherwise every entry is,
+    so {"keys": ["leadtime_receiving_low", "leadtime_receiving_high"]} varies all the lead times.
+    """
+
+    keys: list[str]
+    low: float
+    high: float
+    integer: bool = False
+    index: int | None = None
+
+    @property
+    def name(self) -> str:
+        """Return the name of the dimension."""
+        name = "/".join(self.keys)
+        return name if self.index is None else f"{name}[{self.index}]"
+
+    def value(self, unit: float) -> float:
+        """Return the config value for a point in [0, 1]."""
+        value = self.low + unit * (self.high - self.low)
+        return int(round(value)) if self.integer else float(value)
+
+    def unit(self, value: float) -> float:
+        """Return the point in [0, 1] for a config value."""
+        if self.high == self.low:
+            return 0.0
+        return (value - self.low) / (self.high - self.low)
+
+    def apply(self, config: dict[str, Any], value: float) -> None:
+        """Set the value in config, list values are copied first."""
+        defaults = reset_defaults()
+        for key in self.keys:
+            current = config.get(key, defaults[key])
+            if isinstance(current, list):
+                current = list(current)
+                for index in range(len(current)):
+                    if self.index is None or index == self.index:
+                        current[index] = value
+                config[key] = current
+            else:
+                config[key] = value
+
+    def read(self, config: Mapping[str, Any]) -> float:
+        """Return the value of the dimension in a config, the first key and entry is used."""
+        value = config.get(self.keys[0], reset_defaults()[self.keys[0]])
+        if isinstance(value, list):
+            value = value[self.index or 0]
+        return float(value)
+
+
+def _same_value(first: Any, second: Any) -> bool:
+    """Return True if two config values are equal, numbers up to rounding errors."""
+    if isinstance(first, (list, tuple)) and isinstance(second, (list, tuple)):
+        return len(first) == len(second) and all(
+            _same_value(a, b) for a, b in zip(first, second)
+        )
+    if isinstance(first, (int, float)) and isinstance(second, (int, float)):
+        return math.isclose(first, second, rel_tol=1e-9, abs_tol=1e-9)
+    return first == second
+
+
+def latin_hypercube(
+    count: int, num_dimensions: int, rng: np.random.Generator
+) -> np.ndarray:
+    """Return count points in [0, 1)^num_dimensions, with one point in each of count strata per dimension."""
+    strata = np.argsort(rng.random((num_dimensions, count)), axis=1).T
+    return (strata + rng.random((count, num_dimensions))) / count
+
+
+def features(units: np.ndarray) -> np.ndarray:
+    """Return the quadratic features (1, x, products and squares of x) of a batch of points."""
+    units = np.atleast_2d(units)
+    rows, columns = np.triu_indices(units.shape[1])
+    return np.hstack(
+        [np.ones((len(units), 1)), units, units[:, rows] * units[:, columns]]
+    )
+
+
+class SurrogateModel(object):
+    """Bayesian quadratic regression of the mean episode costs on the dimensions.
+
+    The posterior of the weights gives the uncertainty of each prediction, which grows away
+    from the sampled points, so it tells when the surrogate can be trusted.
+    """
+
+    def __init__(
+        self,
+        dimensions: Sequence[Dimension],
+        base_config: Mapping[str, Any] | None = None,
+        policy: str | None = None,
+        iterations: int = 100,
+        episodes: int = 10,
+        action: int = 0,
+        ridge: float = 1e-3,
+    ):
+        """Create an empty model.
+
+        Args:
+            dimensions: the varied config values.
+            base_config: the config the dimensions are applied to.
+            policy: the agent type of the first agent, if None the config is used as is.
+            iterations: the number of steps per episode.
+            episodes: the number of episodes (seeds 0 to episodes - 1) averaged per sample.
+            action: the order used for Bonsai agents.
+            ridge: the prior precision of the weights, relative to the noise.
+        """
+        self.dimensions = list(dimensions)
+        self.base_config = dict(base_config or {})
+        self.policy = policy
+        self.iterations = iterations
+        self.episodes = episodes
+        self.action = action
+        self.ridge = ridge
+        self.units = np.zeros((0, len(self.dimensions)))
+        self.costs = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.covariance = np.zeros((0, 0))
+        self.noise = math.inf
+        self.scale = 1.0
+
+    def config(self, unit: np.ndarray) -> dict[str, Any]:
+        """Return the reset config for a point in [0, 1]^dimensions."""
+        config = dict(self.base_config)
+        for dimension, value in zip(self.dimensions, unit):
+            dimension.apply(config, dimension.value(float(value)))
+        return config
+
+    def point(self, config: Mapping[str, Any]) -> np.ndarray:
+        """Return the point in [0, 1]^dimensions of a config."""
+        config = {**self.base_config, **config}
+        return np.array(
+            [dimension.unit(dimension.read(config)) for dimension in self.dimensions]
+        )
+
+    def snap(self, units: np.ndarray) -> np.ndarray:
+        """Return the points of the configs that are simulated for units, integer values are rounded."""
+        return np.array(
+            [self.point(self.config(unit)) for unit in np.atleast_2d(units)]
+        )
+
+    def mismatches(self, config: Mapping[str, Any]) -> list[str]:
+        """Return the keys of config that differ from the config of its point.
+
+        These are values that are not dimensions and differ from the base config, or dimension
+        values the model cannot represent, like list entries that differ while the dimension
+        varies them together. The surrogate does not cover such a config.
+        """
+        defaults = reset_defaults()
+        full = {**defaults, **self.base_config, **config}
+        fitted = {**defaults, **self.config(self.point(config))}
+        return sorted(
+            key for key in full if not _same_value(full[key], fitted.get(key))
+        )
+
+    def simulate(
+        self, config: Mapping[str, Any], runner: Callable[..., float] = run_episode
+    ) -> float:
+        """Return the mean costs of the episodes of a config, runner can be EpisodeCache.run_episode."""
+        return float(
+            np.mean(
+                [
+                    runner(config, seed, self.iterations, self.policy, self.action)
+                    for seed in range(self.episodes)
+                ]
+            )
+        )
+
+    def add(self, units: np.ndarray, costs: np.ndarray) -> None:
+        """Add samples and refit."""
+        self.units = np.vstack([self.units, np.atleast_2d(units)])
+        self.costs = np.concatenate([self.costs, np.atleast_1d(costs)])
+        self.fit()
+
+    def fit(self) -> None:
+        """Fit the weights and their posterior covariance to the samples."""
+        design = features(self.units)
+        self.scale = float(np.std(self.costs)) or 1.0
+        targets = self.costs / self.scale
+        precision = design.T @ design + self.ridge * np.eye(design.shape[1])
+        self.covariance = np.linalg.inv(precision)
+        self.weights = self.covariance @ design.T @ targets
+        residuals = targets - design @ self.weights
+        dof = len(targets) - design.shape[1]
+        self.noise = float(residuals @ residuals / dof) if dof > 0 else math.inf
+
+    def predict(self, units: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Return the predicted mean costs and their standard deviations for a batch of points."""
+        design = features(units)
+        mean = design @ self.weights * self.scale
+        variance = self.noise * (
+            1 + np.einsum("ij,jk,ik->i", design, self.covariance, design)
+        )
+        return mean, np.sqrt(variance) * self.scale
+
+    def sample(
+        self,
+        count: int,
+        adaptive_rounds: int = 0,
+        batch: int = 8,
+        candidates: int = 512,
+        seed: int = 0,
+        runner: Callable[..., float] = run_episode,
+    ) -> None:
+        """Sample count Latin hypercube points, then adaptive_rounds batches at the most uncertain points.
+
+        Args:
+            count: the number of initial points, at least the number of features.
+            adaptive_rounds: the number of adaptive rounds.
+            batch: the number of points per adaptive round.
+            candidates: the number of Latin hypercube candidates per adaptive round.
+            seed: the seed for the sampling.
+            runner: the function that runs an episode.
+        """
+        rng = np.random.default_rng(seed)
+        units = self.snap(latin_hypercube(count, len(self.dimensions), rng))
+        self.add(units, [self.simulate(self.config(unit), runner) for unit in units])
+        for _ in range(adaptive_rounds):
+            pool = self.snap(latin_hypercube(candidates, len(self.dimensions), rng))
+            _, std = self.predict(pool)
+            units = pool[np.argsort(std)[-batch:]]
+            self.add(
+                units, [self.simulate(self.config(unit), runner) for unit in units]
+            )
+        _LOGGER.info(
+            "Sampled %s points, noise std %.1f",
+            len(self.costs),
+            math.sqrt(self.noise) * self.scale,
+        )
+
+    def query(
+        self,
+        config: Mapping[str, Any],
+        max_std: float | None = None,
+        runner: Callable[..., float] | None = run_episode,
+        learn: bool = True,
+    ) -> dict[str, Any]:
+        """Return the expected costs of a config, from the surrogate if it is certain enough.
+
+        The config is simulated instead when it lies outside the sampled region, sets values
+        the surrogate does not cover (see mismatches) or the standard deviation of the prediction
+        is above max_std (None always trusts the surrogate). Without a runner, a config the
+        surrogate does not cover raises a ValueError. With learn, simulated configs inside the
+        region are added to the samples.
+        """
+        unit = self.point(config)
+        mismatches = self.mismatches(config)
+        if mismatches and runner is None:
+            raise ValueError(
+                f"The surrogate does not cover the values of {mismatches}."
+            )
+        (mean,), (std,) = self.predict(unit)
+        inside = not mismatches and bool(np.all((unit >= 0) & (unit <= 1)))
+        if runner is None or (inside and (max_std is None or std <= max_std)):
+            return {"mean": float(mean), "std": float(std), "source": "surrogate"}
+        if mismatches:
+            _LOGGER.debug("Simulating, the surrogate does not cover %s", mismatches)
+        costs = self.simulate({**self.base_config, **config}, runner)
+        if learn and inside:
+            self.add(unit, costs)
+        return {"mean": costs, "std": 0.0, "source": "simulation"}
+
+    def save(self, path: str | Path) -> None:
+        """Save the model to an .npz file."""
+        meta = {
+            "dimensions": [asdict(dimension) for dimension in self.dimensions],
+            "base_config": self.base_config,
+            "policy": self.policy,
+            "iterations": self.iterations,
+            "episodes": self.episodes,
+            "action": self.action,
+            "ridge": self.ridge,
+        }
+        np.savez(
+            path, meta=np.array(json.dumps(meta)), units=self.units, costs=self.costs
+        )
+
+    @classmethod
+    def load(cls, path: str | Path) -> SurrogateModel:
+        """Load a model saved with save, the fit is recomputed from the samples."""
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            model = cls(
+                [Dimension(**dimension) for dimension in meta.pop("dimensions")],
+                **meta,
+            )
+            model.add(data["units"], data["costs"])
+        return model
@@ -0,0 +1,223 @@
+"""Library of steady-state snapshots to start episodes from, instead of empty pipelines."""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import math
+from collections import deque
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from .const import HISTORY_WINDOW
+from .kpi import RunningStats
+
+if TYPE_CHECKING:
+    from .beer_game import BeerGame
+    from .beer_game_agent import BeerGameAgent
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_LIBRARY_PATH = ".warm_starts.json"
+_LAST_FIELDS = ("last_order", "last_demand", "last_delivered", "last_received")
+_WINDOW_FIELDS = (
+    "recent_demand",
+    "recent_orders",
+    "recent_shipments",
+    "recent_pipeline",
+)
+
+
+def snapshot_agent(agent: BeerGameAgent) -> dict[str, Any]:
+    """Return the state of an agent, with times relative to the current time."""
+    time = agent.sim.time
+    return {
+        "inventory_level": agent.inventory_level,
+        "customer_orders_to_be_filled": agent.customer_orders_to_be_filled,
+        "supplier_orders_to_be_delivered": agent.supplier_orders_to_be_delivered,
+        "arriving_shipments": {
+            str(key - time): amount
+            for key, amount in agent.arriving_shipments.items()
+            if key > time - HISTORY_WINDOW - 1
+        },
+        "arriving_orders": {
+            str(key - time): amount
+            for key, amount in agent.arriving_orders.items()
+            if key > time - HISTORY_WINDOW - 1
+        },
+        "previous_orders": {
+            str(key - time): amount
+            for key, amount in agent.previous_orders.items()
+            if key > time - HISTORY_WINDOW - 1
+        },
+        **{field: getattr(agent, field) for field in _LAST_FIELDS},
+        **{field: list(getattr(agent, field)) for field in _WINDOW_FIELDS},
+    }
+
+
+def snapshot(sim: BeerGame) -> dict[str, Any]:
+    """Return a snapshot of the chain."""
+    return {"agents": [snapshot_agent(agent) for agent in sim.agents]}
+
+
+def restore(sim: BeerGame, state: Mapping[str, Any]) -> None:
+    """Restore a snapshot into a sim that was just reset, the costs start from 0."""
+    if len(state["agents"]) != sim.num_agents:
+        raise ValueError(
+            f"Snapshot has {len(state['agents'])} agents, the sim has {sim.num_agents}."
+        )
+    for agent, agent_state in zip(sim.agents, state["agents"]):
+        agent.inventory_level = agent_state["inventory_level"]
+        agent.customer_orders_to_be_filled = agent_state["customer_orders_to_be_filled"]
+        agent.supplier_orders_to_be_delivered = agent_state[
+            "supplier_orders_to_be_delivered"
+        ]
+        for field in ("arriving_shipments", "arriving_orders", "previous_orders"):
+            setattr(
+                agent,
+                field,
+                {
+                    sim.time + int(offset): amount
+                    for offset, amount in agent_state[field].items()
+                },
+            )
+        for field in _LAST_FIELDS:
+            setattr(agent, field, agent_state[field])
+        for field in _WINDOW_FIELDS:
+            getattr(agent, field).extend(agent_state[field])
+        agent.shipments_in_transit = sum(
+            amount for key, amount in agent.arriving_shipments.items() if key > sim.time
+        )
+        agent.orders_in_transit = sum(
+            amount for key, amount in agent.arriving_orders.items() if key > sim.time
+        )
+    retailer = sim.agents[0]
+    sim.outstanding_demand = (
+        retailer.customer_orders_to_be_filled + retailer.orders_in_transit
+    )
+
+
+def is_steady(recent: Sequence[RunningStats], blocks: int, tolerance: float) -> bool:
+    """Return True if the means of the last blocks blocks are within tolerance block stds."""
+    if len(recent) < blocks:
+        return False
+    means = [stats.mean for stats in recent]
+    std = math.sqrt(sum(stats.variance for stats in recent) / len(recent))
+    return max(means) - min(means) <= tolerance * std
+
+
+def library_key(config: Mapping[str, Any]) -> str:
+    """Return the default key for a config."""
+    return hashlib.sha256(
+        json.dumps(config, sort_keys=True, default=str).encode()
+    ).hexdigest()[:12]
+
+
+class WarmStartLibrary(object):
+    """Snapshots keyed by name, stored in a JSON file."""
+
+    def __init__(self, path: str | Path = DEFAULT_LIBRARY_PATH):
+        """Load the library, an absent file is an empty library."""
+        self.path = Path(path)
+        self.entries: dict[str, dict[str, Any]] = {}
+        if self.path.exists():
+            with open(self.path) as file:
+                self.entries = json.load(file)
+
+    def save(self) -> None:
+        """Write the library to its file."""
+        with open(self.path, "w") as file:
+            json.dump(self.entries, file)
+
+    def __contains__(self, key: str) -> bool:
+        """Return True if the library has snapshots for key."""
+        return key in self.entries
+
+    def snapshots(self, key: str) -> list[dict[str, Any]]:
+        """Return the snapshots for key."""
+        if key not in self.entries:
+            raise KeyError(f"No warm start '{key}' in {self.path}.")
+        return self.entries[key]["snapshots"]
+
+    def digest(self, key: str) -> str:
+        """Return a hash of the snapshots for key, changes when they are rebuilt."""
+        return hashlib.sha256(
+            json.dumps(self.snapshots(key), sort_keys=True).encode()
+        ).hexdigest()[:16]
+
+    def build(
+        self,
+        config: Mapping[str, Any],
+        key: str | None = None,
+        count: int = 20,
+        spacing: int = 10,
+        block: int = 50,
+        blocks: int = 4,
+        tolerance: float = 1.0,
+        max_burn_in: int = 2000,
+        seed: int = 0,
+        action: int = 0,
+    ) -> str:
+        """Run the config to steady state and store count snapshots, spacing steps apart.
+
+        The level of the chain is its total inventory and backlog. Steady state is reached when the
+        means of the level over the last blocks consecutive blocks of steps lie within tolerance
+        times the standard deviation within a block of each other, so a level that keeps drifting, even
+        slowly, is not steady.
+
+        Args:
+            config: the BeerGame.reset config, its agent types are the reference policies.
+            key: the key to store the snapshots under, derived from the config if None.
+            count: the number of snapshots.
+            spacing: the number of steps between snapshots.
+            block: the number of steps to average for the steady state check.
+            blocks: the number of consecutive blocks that have to agree.
+            tolerance: the spread of the block means, in block standard deviations, that counts
+                as steady.
+            max_burn_in: the maximum number of steps before taking snapshots.
+            seed: the seed for the sim.
+            action: the order used for Bonsai agents.
+
+        Raises:
+            ValueError: if the chain is not in steady state after max_burn_in steps, nothing is
+                stored then.
+        """
+        from .beer_game import BeerGame  # pylint: disable=import-outside-toplevel
+
+        if blocks < 2:
+            raise ValueError(f"At least 2 blocks are needed, not {blocks}.")
+        config = {key: value for key, value in config.items() if key != "warm_start"}
+        key = key or library_key(config)
+        beergame = BeerGame()
+        beergame.reset(**{"seed": seed, **config})
+        recent: deque[RunningStats] = deque(maxlen=blocks)
+        while not is_steady(recent, blocks, tolerance):
+            if beergame.time >= max_burn_in:
+                means = ", ".join(f"{stats.mean:.1f}" for stats in recent)
+                raise ValueError(
+                    f"No steady state for {key} after {beergame.time} steps, the mean level "
+                    f"of the last blocks is still drifting: {means}."
+                )
+            stats = RunningStats()
+            for _ in range(block):
+                beergame.step(action)
+                stats.update(
+                    sum(
+                        agent.inventory_level + agent.customer_orders_to_be_filled
+                        for agent in beergame.agents
+                    )
+                )
+            recent.append(stats)
+        _LOGGER.info("Burn-in for %s took %s steps", key, beergame.time)
+        snapshots = []
+        for _ in range(count):
+            for _ in range(spacing):
+                beergame.step(action)
+            snapshots.append(snapshot(beergame))
+        self.entries[key] = {
+            "config": config,
+            "burn_in": beergame.time - count * spacing,
+            "snapshots": snapshots,
+        }
+        return key
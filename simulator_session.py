@@ -62,7 +62,7 @@ class TemplateSimulatorSession:
         bool
             Whether to terminate current episode
         """
-        return False
+        return self.simulator.halted
 
     def episode_start(self, config: dict[str, Any] = default_config) -> None:
         """
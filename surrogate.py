@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Fit and query a surrogate model of the expected episode costs.
+
+The dimensions file contains a list of {"keys": [...], "low": ..., "high": ..., "integer": false,
+"index": null}, the ranges of the reset config values to vary.
+
+Usage:
+    python surrogate.py fit --dimensions dimensions.json --policy strm --model strm.npz
+    python surrogate.py query --model strm.npz --config config.json --max-std 100
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+from typing import Any
+
+from sim.cache import EpisodeCache
+from sim.evaluation import run_episode
+from sim.surrogate import Dimension, SurrogateModel
+
+
+def load_config(path: str | None) -> dict[str, Any]:
+    """Load a JSON config, empty if path is None."""
+    if not path:
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BeerGame cost surrogate.")
+    parser.add_argument("mode", choices=["fit", "query"])
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        help="Log level used by the logging package, defaults to info.",
+        default="INFO",
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        metavar="CONFIG FILE",
+        help="JSON file with the BeerGame.reset config, the base config to fit or the config to query.",
+        default=None,
+    )
+    parser.add_argument(
+        "--model", type=str, help="The model file (.npz).", default="surrogate.npz"
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        default=False,
+        help="Use the episode cache for the simulations.",
+    )
+    parser.add_argument(
+        "--dimensions", type=str, help="JSON file with the dimensions to fit."
+    )
+    parser.add_argument(
+        "--policy", type=str, help="Agent type of the first agent.", default=None
+    )
+    parser.add_argument(
+        "--iterations", type=int, help="Iterations per episode.", default=100
+    )
+    parser.add_argument(
+        "--episodes", type=int, help="Episodes averaged per sample.", default=10
+    )
+    parser.add_argument(
+        "--samples", type=int, help="Number of Latin hypercube samples.", default=50
+    )
+    parser.add_argument(
+        "--adaptive-rounds", type=int, help="Number of adaptive rounds.", default=0
+    )
+    parser.add_argument(
+        "--batch", type=int, help="Samples per adaptive round.", default=8
+    )
+    parser.add_argument("--seed", type=int, help="Seed of the sampling.", default=0)
+    parser.add_argument(
+        "--max-std",
+        type=float,
+        help="Simulate queries with a larger standard deviation.",
+        default=None,
+    )
+
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper())
+
+    cache = EpisodeCache() if args.cache else None
+    runner = cache.run_episode if cache is not None else run_episode
+    if args.mode == "fit":
+        with open(args.dimensions) as file:
+            dimensions = [Dimension(**dimension) for dimension in json.load(file)]
+        model = SurrogateModel(
+            dimensions,
+            load_config(args.config),
+            policy=args.policy,
+            iterations=args.iterations,
+            episodes=args.episodes,
+        )
+        model.sample(
+            args.samples,
+            adaptive_rounds=args.adaptive_rounds,
+            batch=args.batch,
+            seed=args.seed,
+            runner=runner,
+        )
+        model.save(args.model)
+    else:
+        model = SurrogateModel.load(args.model)
+        result = model.query(
+            load_config(args.config),
+            max_std=args.max_std,
+            runner=runner,
+        )
+        model.save(args.model)
+        print(json.dumps(result, indent=2))
+    if cache is not None:
+        cache.close()
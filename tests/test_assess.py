@@ -0,0 +1,34 @@
+"""Tests of the assessment runner against the local stand-in prediction server."""
+from __future__ import annotations
+
+import asyncio
+import socket
+
+from assess import run_with_stand_in, summarize
+
+
+def free_port() -> int:
+    """Return a free port on localhost."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_stand_in_report():
+    configs = [{}, {"demand_high": 12}]
+    report = asyncio.run(
+        run_with_stand_in(free_port(), configs=configs, episodes=3, iterations=20)
+    )
+    assert [entry["config"] for entry in report] == configs
+    for entry in report:
+        assert entry["failed"] == 0 and entry["errors"] == []
+        assert entry["costs"]["episodes"] == 3
+        assert entry["costs"]["min"] <= entry["costs"]["p50"] <= entry["costs"]["max"]
+        assert len(entry["kpis"]) == 4
+
+
+def test_summarize_without_episodes():
+    assert summarize([]) == {
+        "episodes": 0,
+        **{key: None for key in ("mean", "std", "min", "p5", "p50", "p95", "max")},
+    }
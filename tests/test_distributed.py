@@ -0,0 +1,149 @@
+"""Tests of the distributed evaluation, with a coordinator and worker processes on localhost."""
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import socket
+
+import aiohttp
+import pytest
+
+import distributed
+from distributed import Coordinator
+from sim.evaluation import run_episode
+from sim.kpi import RunningStats
+
+SWEEP = [
+    {"policy": "strm", "episodes": 2, "iterations": 2000},
+    {"policy": "basestock", "episodes": 12, "iterations": 50},
+]
+
+
+def free_port() -> int:
+    """Return a free port on localhost."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def expected_means() -> list[float]:
+    """Return the mean costs of the sweep entries, run in this process."""
+    means = []
+    for entry in SWEEP:
+        stats = RunningStats()
+        for seed in range(entry["episodes"]):
+            stats.update(run_episode({}, seed, entry["iterations"], entry["policy"]))
+        means.append(stats.mean)
+    return means
+
+
+def _stalling_worker(url: str) -> None:
+    """Take a unit and exit without heartbeats or a result, like a worker that crashed."""
+
+    async def take() -> None:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(url + "/work", json={"worker_id": "stalled"}):
+                pass
+
+    asyncio.run(take())
+
+
+def test_late_result_is_accepted():
+    coordinator = Coordinator(SWEEP, unit_size=2, lease_timeout=1.0)
+    unit = coordinator.next_unit("slow")
+    coordinator.leases[unit.unit_id].workers["slow"] = 0.0
+    coordinator.expire_leases()
+    assert coordinator.pending[0] is unit
+    assert coordinator.requeued == 1
+
+    stats = RunningStats()
+    stats.update(1.0)
+    coordinator.complete(unit.unit_id, stats.to_dict())
+    assert unit.unit_id in coordinator.completed
+    assert all(pending.unit_id != unit.unit_id for pending in coordinator.pending)
+    assert coordinator.next_unit("fast").unit_id != unit.unit_id
+    # a second result for the same unit is ignored
+    coordinator.complete(unit.unit_id, stats.to_dict())
+    assert coordinator.results[unit.sweep_index].count == 1
+
+
+def test_local_workers_requeue_and_steal(monkeypatch: pytest.MonkeyPatch):
+    # short intervals, inherited by the forked worker processes
+    monkeypatch.setattr(distributed, "HEARTBEAT_INTERVAL", 0.2)
+    context = multiprocessing.get_context("fork")
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    coordinator = Coordinator(SWEEP, unit_size=2, lease_timeout=1.0)
+    workers = [
+        context.Process(target=distributed._worker_process, args=(url, "INFO", None))
+        for _ in range(3)
+    ]
+
+    async def coordinate() -> list[dict]:
+        serving = asyncio.create_task(coordinator.serve("127.0.0.1", port))
+        await asyncio.sleep(0.5)
+        stalled = context.Process(target=_stalling_worker, args=(url,))
+        stalled.start()
+        await asyncio.get_running_loop().run_in_executor(None, stalled.join, 10)
+        assert coordinator.status["running"] == 1
+        # the lease of the stalled worker expires before anyone could steal the unit
+        await asyncio.sleep(1.5)
+        assert coordinator.requeued == 1 and not coordinator.leases
+        for process in workers:
+            process.start()
+        return await asyncio.wait_for(serving, 60)
+
+    try:
+        report = asyncio.run(coordinate())
+    finally:
+        for process in workers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    assert coordinator.done
+    assert not coordinator.pending and not coordinator.leases
+    assert coordinator.requeued >= 1
+    assert coordinator.stolen >= 1
+    assert [entry["episodes"] for entry in report] == [2, 12]
+    for entry, mean in zip(report, expected_means()):
+        assert entry["mean"] == pytest.approx(mean)
+
+
+def test_failing_unit_is_reported(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(distributed, "HEARTBEAT_INTERVAL", 0.2)
+    context = multiprocessing.get_context("fork")
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    # the dp agent needs stationary demand, so every episode of the first entry raises
+    sweep = [
+        {"policy": "dp", "config": {"demand_distribution": "pattern"}, "episodes": 2},
+        {"policy": "basestock", "episodes": 4, "iterations": 50},
+    ]
+    coordinator = Coordinator(sweep, unit_size=2, lease_timeout=1.0, max_attempts=2)
+    workers = [
+        context.Process(target=distributed._worker_process, args=(url, "INFO", None))
+        for _ in range(2)
+    ]
+
+    async def coordinate() -> list[dict]:
+        serving = asyncio.create_task(coordinator.serve("127.0.0.1", port))
+        await asyncio.sleep(0.5)
+        for process in workers:
+            process.start()
+        return await asyncio.wait_for(serving, 30)
+
+    try:
+        report = asyncio.run(coordinate())
+    finally:
+        for process in workers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    assert [process.exitcode for process in workers] == [0, 0]
+    assert coordinator.done and list(coordinator.failed) == ["0-0"]
+    assert coordinator.attempts["0-0"] == 2
+    assert report[0]["failed_units"] == 1 and report[0]["episodes"] == 0
+    assert "ValueError" in report[0]["errors"]["0-0"]
+    assert report[1]["failed_units"] == 0 and report[1]["episodes"] == 4
@@ -0,0 +1,73 @@
+"""Tests that the event-driven engine gives the same results as stepping every period."""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from sim.beer_game import BeerGame
+from sim.event_engine import EventDrivenEngine
+from sim.warm_start import WarmStartLibrary
+
+STRM = ["strm", "strm", "strm", "strm"]
+IDLE = {"demand_distribution": "pattern", "demand_low": 0, "demand_high": 0}
+CONFIGS = [
+    {**IDLE, "agent_types": STRM, "seed": 1, "inventory_initial": [3, 0, 2, 0]},
+    {**IDLE, "agent_types": STRM, "seed": 2, "arriving_shipments_initial": [4] * 4},
+    {
+        "demand_distribution": "pattern",
+        "demand_low": 4,
+        "demand_high": 0,
+        "demand_pattern_step_time": 20,
+        "agent_types": STRM,
+        "seed": 3,
+    },
+    {"demand_low": 0, "demand_high": 1, "agent_types": STRM, "seed": 4},
+    {"agent_types": ["basestock", "strm", "strm", "basestock"], "seed": 5},
+]
+# the cost quantiles are estimated differently when periods are skipped
+ESTIMATED = {"costs_p50", "costs_p95"}
+
+
+def outcome(sim: BeerGame) -> dict[str, float]:
+    """Return the state of the sim that both engines have to agree on, flattened."""
+    values = {"time": sim.time}
+    for num, (agent, report) in enumerate(zip(sim.agents, sim.kpis.report)):
+        values[f"{num}.total_costs"] = agent.total_costs
+        values[f"{num}.inventory"] = agent.inventory_level
+        values[f"{num}.backlog"] = agent.customer_orders_to_be_filled
+        for key, value in report.items():
+            if key not in ESTIMATED:
+                values[f"{num}.kpis.{key}"] = value
+    return values
+
+
+def compare(config: dict[str, Any], periods: int, **kwargs: Any) -> int:
+    """Run config with both engines, check they agree and return the skipped periods."""
+    stepped = BeerGame(**kwargs)
+    stepped.reset(**config)
+    for _ in range(periods):
+        stepped.step(0)
+    skipping = BeerGame(**kwargs)
+    skipping.reset(**config)
+    engine = EventDrivenEngine(skipping)
+    engine.run(periods)
+    assert outcome(skipping) == pytest.approx(outcome(stepped))
+    return engine.skipped
+
+
+@pytest.mark.parametrize("config", CONFIGS)
+def test_engine_matches_stepping(config: dict[str, Any]):
+    compare(config, 200)
+
+
+def test_idle_chain_with_initial_inventory_is_skipped():
+    assert compare(CONFIGS[0], 50) == 50
+
+
+def test_engine_matches_stepping_from_warm_start(tmp_path: Path):
+    library = WarmStartLibrary(tmp_path / "warm_starts.json")
+    library.build({**IDLE, "agent_types": STRM}, key="idle", count=3, seed=0)
+    config = {**IDLE, "agent_types": STRM, "seed": 6, "warm_start": "idle"}
+    assert compare(config, 100, warm_start_library=library) > 0
@@ -0,0 +1,85 @@
+"""Tests of the incremental KPIs against NumPy on stored sequences."""
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from sim.kpi import AgentKPIs, P2Quantile, RunningStats
+
+VALUES = [
+    12.0, 7.5, 3.25, 19.0, 0.0, 4.0, 4.0, 11.5, 8.75, 2.0,
+    15.0, 6.5, 9.0, 1.25, 13.0, 5.5, 4.0, 17.25, 10.0, 3.0,
+]  # fmt: skip
+
+
+def stats_of(values: list[float]) -> RunningStats:
+    """Return the running stats of values."""
+    stats = RunningStats()
+    for value in values:
+        stats.update(value)
+    return stats
+
+
+def test_running_stats_match_numpy():
+    stats = stats_of(VALUES)
+    assert stats.count == len(VALUES)
+    assert stats.mean == pytest.approx(np.mean(VALUES))
+    assert stats.variance == pytest.approx(np.var(VALUES))
+    assert stats.sample_variance == pytest.approx(np.var(VALUES, ddof=1))
+    assert (stats.min, stats.max) == (min(VALUES), max(VALUES))
+
+
+def test_merged_halves_match_numpy():
+    merged = stats_of(VALUES[:7])
+    merged.merge(RunningStats.from_dict(stats_of(VALUES[7:]).to_dict()))
+    assert merged.count == len(VALUES)
+    assert merged.mean == pytest.approx(np.mean(VALUES))
+    assert merged.variance == pytest.approx(np.var(VALUES))
+    assert (merged.min, merged.max) == (min(VALUES), max(VALUES))
+
+
+def test_update_repeated_matches_updates():
+    repeated = stats_of(VALUES)
+    repeated.update_repeated(6.0, 30)
+    assert repeated.mean == pytest.approx(np.mean(VALUES + [6.0] * 30))
+    assert repeated.variance == pytest.approx(np.var(VALUES + [6.0] * 30))
+
+
+@pytest.mark.parametrize("p", [0.5, 0.95])
+def test_p2_quantile_close_to_numpy(p: float):
+    values = np.random.default_rng(0).normal(50, 10, 5000)
+    sketch = P2Quantile(p)
+    for value in values:
+        sketch.update(float(value))
+    assert sketch.value == pytest.approx(np.quantile(values, p), abs=1.0)
+
+
+def test_p2_quantile_repeated_values():
+    sketch = P2Quantile(0.5)
+    for value in VALUES:
+        sketch.update(value)
+    sketch.update_repeated(136.0, 10000)
+    assert sketch.value == 136.0
+
+
+def test_fill_rate_trace():
+    # (demand, delivered, backlog after the step), the backlog is served before new demand
+    trace = [(4, 3, 1), (2, 3, 0), (5, 0, 5), (1, 4, 2)]
+    kpis = AgentKPIs()
+    for demand, delivered, backlog in trace:
+        kpis.update(
+            SimpleNamespace(
+                last_demand=demand,
+                last_order=0,
+                last_delivered=delivered,
+                inventory_level=0,
+                customer_orders_to_be_filled=backlog,
+                current_costs=backlog,
+            )
+        )
+    # 3 of 4, then 2 of 2 after the backlog of 1, then nothing, then only the backlog of 5 is served
+    assert kpis.total_demand == 12
+    assert kpis.filled_immediately == 5
+    assert kpis.fill_rate == pytest.approx(5 / 12)
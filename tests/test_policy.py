@@ -0,0 +1,44 @@
+"""Tests of the batched policy runner."""
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from assess import assess_policy
+from sim.beer_game import BeerGame
+from sim.const import OBSERVATION_FIELDS
+from sim.policy import BatchedPolicyRunner, MLPPolicy
+
+ORDER = 4
+
+
+def constant_policy() -> MLPPolicy:
+    """Return a policy that always orders ORDER."""
+    return MLPPolicy(
+        {"W0": np.zeros((len(OBSERVATION_FIELDS), 1)), "b0": np.array([ORDER])}
+    )
+
+
+def test_assess_policy_drives_the_first_agent(tmp_path: Path):
+    path = tmp_path / "policy.npz"
+    np.savez(path, W0=np.zeros((len(OBSERVATION_FIELDS), 1)), b0=np.array([ORDER]))
+    config = {"agent_types": ["strm", "strm", "strm", "strm"], "seed": 3}
+    (report,) = assess_policy(str(path), [config], episodes=1, iterations=30)
+
+    beergame = BeerGame()
+    beergame.reset(**{**config, "agent_types": ["bonsai", "strm", "strm", "strm"]})
+    for _ in range(30):
+        beergame.step(ORDER)
+    assert report["costs"]["mean"] == float(
+        sum(agent.total_costs for agent in beergame.agents)
+    )
+
+
+@pytest.mark.parametrize("agent_num", [1, 4, -1])
+def test_runner_rejects_agents_it_cannot_drive(agent_num: int):
+    beergame = BeerGame()
+    beergame.reset(agent_types=["bonsai", "strm", "strm", "strm"])
+    with pytest.raises(ValueError):
+        BatchedPolicyRunner(constant_policy(), [beergame], agent_num=agent_num)
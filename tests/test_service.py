@@ -0,0 +1,37 @@
+"""Tests of the request validation of the simulation service."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from service import SimulationService, expand_request
+
+
+def test_expand_request():
+    jobs = expand_request({"episodes": 3, "seed": 10, "iterations": 20}, 4)
+    assert [job["seed"] for job in jobs] == [10, 11, 12]
+    assert all(job["iterations"] == 20 for job in jobs)
+    assert len(expand_request({}, 4)) == 1
+
+
+@pytest.mark.parametrize("episodes", [0, -1, 5, 10**9, 2.0, "3", True, None])
+def test_invalid_episodes_are_rejected(episodes: object):
+    with pytest.raises(ValueError, match="episodes"):
+        expand_request({"episodes": episodes}, 4)
+
+
+@pytest.mark.parametrize("episodes", [10**9, 0, "many"])
+def test_run_rejects_invalid_episodes_before_queueing(episodes: object):
+    # the pool is never started, these requests must not get as far as running a job
+    service = SimulationService(workers=1, max_queue=4)
+
+    async def post() -> tuple[int, str]:
+        async with TestClient(TestServer(service.app())) as client:
+            response = await client.post("/run", json={"episodes": episodes})
+            return response.status, await response.text()
+
+    status, text = asyncio.run(post())
+    assert status == 400 and "episodes" in text
+    assert service.rejected == 0 and service.queued == 0
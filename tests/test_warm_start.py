@@ -0,0 +1,52 @@
+"""Tests of the steady state check of the warm start library."""
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from sim.kpi import RunningStats
+from sim.warm_start import WarmStartLibrary, is_steady
+
+
+def block_stats(levels: np.ndarray, block: int) -> list[RunningStats]:
+    """Return the running stats of each block of levels."""
+    blocks = []
+    for values in levels.reshape(-1, block):
+        stats = RunningStats()
+        for value in values:
+            stats.update(float(value))
+        blocks.append(stats)
+    return blocks
+
+
+def test_slow_drift_is_not_steady():
+    noise = np.random.default_rng(0).normal(0, 5, 200)
+    # 0.1 per step is a 1% change per block at this level, a relative check accepts it
+    drifting = 1000 + 0.1 * np.arange(200) + noise
+    assert not is_steady(block_stats(drifting, 50), 4, 1.0)
+    assert is_steady(block_stats(1000 + noise, 50), 4, 1.0)
+    assert not is_steady(block_stats(1000 + noise, 50)[1:], 4, 1.0)
+
+
+def test_growing_backlog_is_refused(tmp_path: Path):
+    library = WarmStartLibrary(tmp_path / "warm_starts.json")
+    config = {"agent_types": ["strm"] * 4, "costs_shortage": [2, 1, 1, 1]}
+    with pytest.raises(ValueError, match="No steady state"):
+        library.build(config, key="growing", count=2, max_burn_in=1000)
+    assert "growing" not in library
+
+
+def test_constant_chain_is_steady(tmp_path: Path):
+    library = WarmStartLibrary(tmp_path / "warm_starts.json")
+    config = {
+        "demand_distribution": "pattern",
+        "demand_low": 0,
+        "demand_high": 0,
+        "agent_types": ["strm"] * 4,
+        "inventory_initial": [3, 0, 2, 0],
+    }
+    library.build(config, key="idle", count=2, spacing=5)
+    assert library.entries["idle"]["burn_in"] == 4 * 50
+    assert len(library.snapshots("idle")) == 2